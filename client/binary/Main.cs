@@ -854,6 +854,12 @@ namespace ShellServer
                 "no-trackdir",
                 "fallback",
                 "no-fallback",
+                "adaptive",
+                "no-adaptive",
+                "dirty-only",
+                "no-dirty-only",
+                "threaded",
+                "no-threaded",
                 "watchdog",
                 "no-watchdog",
                 "disable-git",
@@ -0,0 +1,92 @@
+"""
+Benchmark of the ways gitstatus walks the worktree: by a single thread,
+by a pool of threads and by worker processes.
+
+usage: python gitstatus_bench.py [--runs=N] [--workers=N] [--no-multiproc]
+                                 REPO...
+"""
+
+import statistics
+import sys
+import time
+
+from shellserver.gitstatus import high, interface
+
+MODES = {
+    'linear': {},
+    'threaded': {'threaded': True},
+    'multiproc': {'multiproc': True},
+}
+
+
+def bench(
+    obj: high.High, git_dir: str, runs: int
+) -> tuple[list[float], str | None]:
+    """
+    return: tuple: The milliseconds of each run and the last status.
+    """
+    obj.init(git_dir, interface._get_branch_on_head(git_dir))
+    # the first run reads the index and the trees, kept by the caches
+    status = obj.status()
+
+    times = []
+    for _ in range(runs):
+        init = time.perf_counter()
+        status = obj.status()
+        times.append((time.perf_counter() - init) * 1000)
+
+    return times, status
+
+
+def main() -> None:
+    runs = 10
+    workers = 0
+    modes = list(MODES)
+    repos = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--runs='):
+            runs = int(arg.removeprefix('--runs='))
+        elif arg.startswith('--workers='):
+            workers = int(arg.removeprefix('--workers='))
+        elif arg == '--no-multiproc':
+            modes.remove('multiproc')
+        else:
+            repos.append(arg)
+
+    if not repos:
+        print(__doc__)
+        return
+
+    print(f'{"repo":<30} {"mode":<10} {"median":>9} {"min":>9}  status')
+    for mode in modes:
+        # worker processes and shared memory are set up once, as the
+        # server does
+        obj = high.High(
+            watchdog=False,
+            fallback=False,
+            workers=workers or high.OS_CPU_COUNT - 1,
+            **MODES[mode]
+        )
+
+        for git_dir in repos:
+            try:
+                times, status = bench(obj, git_dir, runs)
+            except high.FallbackError as err:
+                print(f'{git_dir[-30:]:<30} {mode:<10} fallback: {err}')
+                continue
+
+            print(
+                f'{git_dir[-30:]:<30} {mode:<10} '
+                f'{statistics.median(times):>7.1f}ms '
+                f'{min(times):>7.1f}ms  {status}'
+            )
+
+        obj.close_pool()
+        if mode == 'multiproc':
+            obj.write_shm(flag=high.MemFlag.QUIT)
+            obj.shm.close()
+            obj.shm.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 import os
 import random
 import string
+import struct
 import subprocess
 import tempfile
 import unittest
+import zlib
 
-from shellserver.gitstatus import interface
+from shellserver.gitstatus import (
+    cache, high, index, interface, objects, packs, refs, selector
+)
 
 
 interface.init()
@@ -46,7 +50,7 @@ class TestGitstatusLowEmpty(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_empty_get_dot_git(self):
@@ -62,6 +66,10 @@ class TestGitstatusLowEmpty(unittest.TestCase):
         branch = interface._get_branch_on_head(self.temp)
         self.assertEqual(branch, 'main')
 
+        popen(f'git -C {self.temp} branch -M feature/login')
+        branch = interface._get_branch_on_head(self.temp)
+        self.assertEqual(branch, 'feature/login')
+
 
 class TestGitstatusLowEmpty2(unittest.TestCase):
     """
@@ -77,7 +85,7 @@ class TestGitstatusLowEmpty2(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_empty_get_info_packs_content(self):
@@ -94,13 +102,34 @@ class TestGitstatusLowEmpty2(unittest.TestCase):
         tested = obj.get_gitignore_content(self.temp)
         self.assertEqual(tested, [text])
 
+    def test_empty_get_gitignore_hash(self):
+        gitignore = self.temp + '/.gitignore'
+        with open(gitignore, 'w') as f:
+            print('first', file=f)
+        # cached with its stamp
+        tested = obj.get_gitignore_content(self.temp)
+        self.assertEqual(tested, ['first'])
+
+        with open(gitignore, 'w') as f:
+            print('other text\n\n*.log', file=f)
+
+        # read again, the size changed
+        tested = obj.get_gitignore_content(self.temp)
+        self.assertEqual(tested, ['other text', '*.log'])
+
+        local = popen(f'git hash-object --no-filters {gitignore}')
+        self.assertEqual(
+            obj.get_gitignore_hash(self.temp), local.decode().strip()
+        )
+        self.assertIsNone(obj.get_gitignore_hash(self.temp + '/.git'))
+
     def test_empty_get_last_commit_loose(self):
         tested = obj.get_last_commit_loose()
         self.assertIsNone(tested)
 
-    def test_empty_get_info_refs_content(self):
-        tested = obj.get_info_refs_content()
-        self.assertEqual(tested, [])
+    def test_empty_get_packed_refs(self):
+        tested = refs.get_packed_refs(self.temp)
+        self.assertEqual(tested, {})
 
     def test_empty_get_exclude_content(self):
         tested = obj.get_exclude_content()
@@ -128,6 +157,23 @@ class TestGitstatusLowEmpty2(unittest.TestCase):
         tested = obj.get_tree_hash_from_commit(cmmt_obj)
         self.assertEqual(tested, tree_hash.decode())
 
+    def test_empty_parse_tree_object(self):
+        sha = bytes(range(20))
+        data = (
+            b'100644 a file\x00' + sha
+            + b'40000 dir\x00' + sha
+            + b'160000 sub\x00' + sha
+            + b'120000 link\x00' + sha
+        )
+        tested = obj.parse_tree_object(b'tree 99\x00' + data)
+        self.assertEqual(
+            tested.blobs, {'a file': (0o100644, sha), 'link': (0o120000, sha)}
+        )
+        self.assertEqual(tested.trees, {'dir': sha})
+        self.assertEqual(tested.get_file('sub'), (0o160000, sha))
+        self.assertIsNone(tested.get_file('dir'))
+        self.assertEqual(len(obj.parse_tree_object(b'', from_pack=True)), 0)
+
     def test_empty_get_status_string(self):
         sts = (0, 0, 0, 0)
         tested = obj.get_status_string(sts)
@@ -161,6 +207,14 @@ class TestGitstatusLowEmpty2(unittest.TestCase):
         tested = obj.get_status_string(sts)
         self.assertEqual(tested, '+1 x1')
 
+        sts = (1, 0, 3, 0)
+        tested = obj.get_status_string(sts, partial=True)
+        self.assertEqual(tested, '?1+ m3+')
+
+        sts = (0, 0, 0, 0)
+        tested = obj.get_status_string(sts, partial=True)
+        self.assertIsNone(tested)
+
     def test_empty_exists_head(self):
         tested = interface._exists_head(self.temp)
         path = os.path.join(self.temp, '.git/HEAD')
@@ -192,7 +246,7 @@ class TestGitstatusLowLoose(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     '''
@@ -216,10 +270,10 @@ class TestGitstatusLowLoose(unittest.TestCase):
             local = file.read()
         self.assertEqual(tested, local.strip())
 
-    def test_loose_get_info_refs_content(self):
-        # should only exists if there are packed files
-        tested = obj.get_info_refs_content()
-        self.assertEqual(tested, [])
+    def test_loose_get_packed_refs(self):
+        # should only exists if there are packed refs
+        tested = refs.get_packed_refs(self.temp)
+        self.assertEqual(tested, {})
 
     '''
     def test_loose_get_exclude_content(self):
@@ -252,6 +306,12 @@ class TestGitstatusLowLoose(unittest.TestCase):
         ).strip()
         self.assertIn(local, tested)
 
+    def test_loose_get_header_by_hash_loose(self):
+        file_hash = obj.get_hash_of_file(self.temp + '/file.txt')
+        tested = obj.get_header_by_hash_loose(file_hash)
+        size = popen(f'git -C {self.temp} cat-file -s {file_hash}')
+        self.assertEqual(tested, ('blob', int(size)))
+
     '''
     def test_loose_get_tree_hash_from_commit(self):
         # no need to retest
@@ -288,7 +348,7 @@ class TestGitstatusLowPacked(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     '''
@@ -309,13 +369,11 @@ class TestGitstatusLowPacked(unittest.TestCase):
         tested = obj.get_last_commit_loose()
         self.assertIsNone(tested)
 
-    def test_packed_get_info_refs_content(self):
-        tested = obj.get_info_refs_content()
-        refs = os.path.join(self.temp, '.git/info/refs')
-        with open(refs) as file:
-            local = file.readlines()
-        local = [i.strip() for i in local if i.strip()]
-        self.assertEqual(tested, local)
+    def test_packed_get_packed_refs(self):
+        tested = refs.get_packed_refs(self.temp)
+        local = popen(f'git -C {self.temp} show-ref').decode().split()
+        # hash and name by line, every ref was packed by gc
+        self.assertEqual(tested, dict(zip(local[1::2], local[::2])))
 
     '''
     def test_packed_get_exclude_content(self):
@@ -359,7 +417,7 @@ class TestGitstatusMediumEmpty(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_empty_get_packs(self):
@@ -399,7 +457,7 @@ class TestGitstatusMediumLoose(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     """
@@ -442,6 +500,62 @@ class TestGitstatusMediumLoose(unittest.TestCase):
         # setUpClass created two files
         self.assertEqual(len(tested), 6)
 
+    def test_loose_get_index_tracked_v4(self):
+        ni(self.temp, 'dir/other')
+        ni(self.temp, 'dir/some/file')
+        popen(f'git -C {self.temp} add .')
+        popen(f'git -C {self.temp} update-index --index-version 4')
+
+        obj.set_index_tracked()
+        tested = obj.index_tracked
+
+        local = popen(f'git -C {self.temp} ls-files').decode().split()
+        self.assertEqual(sorted(tested), sorted(local))
+
+    def test_loose_get_index_tracked_split(self):
+        ni(self.temp, 'dir/split')
+        popen(f'git -C {self.temp} update-index --split-index')
+        popen(f'git -C {self.temp} add .')
+
+        obj.set_index_tracked()
+        tested = obj.index_tracked
+
+        local = popen(f'git -C {self.temp} ls-files').decode().split()
+        self.assertEqual(sorted(tested), sorted(local))
+        popen(f'git -C {self.temp} update-index --no-split-index')
+
+    def test_loose_merge_split_index(self):
+        def entry(sha: bytes) -> index.IndexEntry:
+            return index.IndexEntry(
+                0, 0, 0, 0, 0, 0, 0o100644, 0, 0, 0, sha, 0
+            )
+
+        # the three stages of a conflict are three positions
+        shared = [
+            ('a', entry(b'1')), ('a', entry(b'2')), ('a', entry(b'3')),
+            ('b', entry(b'4')), ('c', entry(b'5'))
+        ]
+        tested = index.merge_split_index(
+            shared, {'d': entry(b'7')}, [entry(b'6')], {4}, {3}
+        )
+        expected = {'a': entry(b'3'), 'b': entry(b'6'), 'd': entry(b'7')}
+        self.assertEqual(tested, expected)
+
+    def test_loose_index_cache(self):
+        obj.set_index_tracked()
+        hits = obj.index_cache.hits
+        first = obj.index_tracked
+
+        obj.set_index_tracked()
+        self.assertIs(obj.index_tracked, first)
+        self.assertEqual(obj.index_cache.hits, hits + 1)
+
+        ni(self.temp, 'cached')
+        popen(f'git -C {self.temp} add cached')
+        obj.set_index_tracked()
+        self.assertIsNot(obj.index_tracked, first)
+        self.assertIn('cached', obj.index_tracked)
+
 
 class TestGitstatusMediumPacked(unittest.TestCase):
     """
@@ -463,7 +577,7 @@ class TestGitstatusMediumPacked(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_packed_get_packs(self):
@@ -488,11 +602,11 @@ class TestGitstatusMediumPacked(unittest.TestCase):
         obj.set_packs()
 
         tested = obj.get_last_commit_packed()
-        refs = obj.get_info_refs_content()
         self.assertEqual(len(tested), 40)
         self.assertTrue(int(tested, 16))
         self.assertEqual(tested, tested.strip())
-        self.assertIn(tested, refs[0])
+        local = popen(f'git -C {self.temp} rev-parse master').decode()
+        self.assertEqual(tested, local.strip())
 
     def test_packed_get_last_commit(self):
         obj.set_packs()
@@ -501,6 +615,23 @@ class TestGitstatusMediumPacked(unittest.TestCase):
         other_tested = obj.get_last_commit_packed()
         self.assertEqual(tested, other_tested)
 
+    def test_packed_get_last_commit_nested_branch(self):
+        popen(f'git -C {self.temp} branch feature/login')
+        popen(f'git -C {self.temp} pack-refs --all')
+        popen(
+            f'git -C {self.temp} symbolic-ref refs/heads/alias '
+            'refs/heads/feature/login'
+        )
+        master = popen(f'git -C {self.temp} rev-parse master').decode()
+        master = master.strip()
+
+        obj.init(self.temp, 'feature/login')
+        self.assertIsNone(obj.get_last_commit_loose())
+        self.assertEqual(obj.get_last_commit_hash(), master)
+        self.assertEqual(refs.resolve(self.temp, 'refs/heads/alias'), master)
+        self.assertIsNone(refs.resolve(self.temp, 'refs/heads/feature'))
+        obj.init(self.temp, 'master')
+
 
 class TestGitstatusPacksPacked(unittest.TestCase):
     """
@@ -524,9 +655,34 @@ class TestGitstatusPacksPacked(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
+    def test_maps_closed_after_status(self):
+        interface._populate_status()
+        self.assertEqual(obj.maps, {})
+
+        # as gc does, refused on Windows for a mapped file
+        pack = obj.packs_list[0]
+        os.replace(pack, pack + '.old')
+        os.replace(pack + '.old', pack)
+
+    def test_multi_pack_index_closed_after_status(self):
+        popen(f'git -C {self.temp} multi-pack-index write')
+        pack_dir = os.path.dirname(obj.packs_list[0])
+        midx = os.path.join(pack_dir, 'multi-pack-index')
+        self.assertIsInstance(
+            obj.get_multi_index(pack_dir, obj.packs_list),
+            packs.MultiPackIndex
+        )
+
+        interface._populate_status()
+        self.assertNotIn(midx, obj.maps)
+        self.assertEqual(obj.multi_indexes, {})
+        # as `multi-pack-index write` does
+        os.replace(midx, midx + '.old')
+        os.remove(midx + '.old')
+
     def test_search_idx(self):
         idx_path = obj.get_idx_of_pack(
             obj.packs_list[0]
@@ -539,6 +695,68 @@ class TestGitstatusPacksPacked(unittest.TestCase):
         tested = obj.search_idx(idx_path, filecr_hash)
         self.assertTrue(tested)
 
+    def test_pack_index_large_offset(self):
+        shas = sorted(bytes([i] * 20) for i in (1, 2, 200))
+        fanout = [sum(sha[0] <= i for sha in shas) for i in range(256)]
+        data = (
+            b'\xfftOc' + struct.pack('>L', 2)
+            + struct.pack('>256L', *fanout)
+            + b''.join(shas)
+            + b'\x00' * 4 * len(shas)  # crc32
+            + struct.pack('>3L', 12, 0x80000000, 0x80000001)
+            + struct.pack('>2Q', 5 * 2 ** 30, 3 * 2 ** 32)
+        )
+
+        tested = packs.PackIndex(data)
+        self.assertEqual(tested.lookup(shas[0]), 12)
+        self.assertEqual(tested.lookup(shas[1]), 5 * 2 ** 30)
+        self.assertEqual(tested.lookup(shas[2]), 3 * 2 ** 32)
+        self.assertIsNone(tested.lookup(bytes([3] * 20)))
+
+    def test_multi_pack_index(self):
+        shas = sorted(bytes([i] * 20) for i in (1, 2, 200))
+        fanout = [sum(sha[0] <= i for sha in shas) for i in range(256)]
+        names = b'pack-a.idx\x00pack-b.idx\x00\x00\x00'
+        chunks = [
+            (b'PNAM', names),
+            (b'OIDF', struct.pack('>256L', *fanout)),
+            (b'OIDL', b''.join(shas)),
+            (b'OOFF', struct.pack('>6L', 0, 12, 1, 0x80000000, 1, 40)),
+            (b'LOFF', struct.pack('>Q', 5 * 2 ** 30)),
+        ]
+        start = 12 + 12 * (len(chunks) + 1)
+        table = b''
+        for id_, chunk in chunks:
+            table += struct.pack('>4sQ', id_, start)
+            start += len(chunk)
+        table += struct.pack('>4sQ', b'\x00' * 4, start)
+        data = (
+            b'MIDX' + struct.pack('>4BL', 1, 1, len(chunks), 0, 2)
+            + table + b''.join(i[1] for i in chunks)
+        )
+
+        tested = packs.MultiPackIndex(data, 'dir')
+        pack_a = os.path.join('dir', 'pack-a.pack')
+        pack_b = os.path.join('dir', 'pack-b.pack')
+        self.assertEqual(tested.packs, {pack_a, pack_b})
+        self.assertEqual(tested.lookup(shas[0]), (pack_a, 12))
+        self.assertEqual(tested.lookup(shas[1]), (pack_b, 5 * 2 ** 30))
+        self.assertEqual(tested.lookup(shas[2]), (pack_b, 40))
+        self.assertIsNone(tested.lookup(bytes([3] * 20)))
+
+    def test_merged_index(self):
+        pack = obj.packs_list[0]
+        pack_index = obj.get_pack_index(obj.get_idx_of_pack(pack))
+        file_hash = obj.get_hash_of_file(self.temp + '/file.txt')
+
+        tested = packs.MergedIndex([pack, 'other'], [pack_index] * 2)
+        self.assertEqual(len(tested), 2 * len(pack_index))
+        self.assertEqual(
+            tested.lookup(bytes.fromhex(file_hash))[1],
+            obj.search_idx(obj.get_idx_of_pack(pack), file_hash)
+        )
+        self.assertIsNone(tested.lookup(bytes([3] * 20)))
+
     def test_get_content_by_offset(self):
         pack = obj.packs_list[0]
         idx_path = obj.get_idx_of_pack(pack)
@@ -559,6 +777,141 @@ class TestGitstatusPacksPacked(unittest.TestCase):
         self.assertEqual(local2, filecr_obj)
 
 
+class TestGitstatusPacksDelta(unittest.TestCase):
+    """
+    Tests for packs module with objects stored as deltas.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        content = get_random_string() * 20
+        for i in range(5):
+            content += get_random_string() + '\n'
+            with open(f'{cls.temp}/file.txt', 'w') as file:
+                file.write(content)
+            ni(cls.temp, f'dir/file{i}')
+            popen(f'git -C {cls.temp} add .')
+            popen(f'git -C {cls.temp} commit -m "{i}"')
+        popen(f'git -C {cls.temp} repack -adf --depth=10')
+        obj.init(cls.temp, 'master')
+        obj.set_packs()
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def test_get_content_by_hash_packed_delta(self):
+        objects = popen(
+            f'git -C {self.temp} cat-file --batch-all-objects --batch-check'
+        ).decode().splitlines()
+
+        for line in objects:
+            hash_, type_, _ = line.split()
+            local = popen(f'git -C {self.temp} cat-file {type_} {hash_}')
+            tested = obj.get_content_by_hash_packed(hash_)
+            self.assertEqual(local, tested)
+
+    def test_get_header_by_offset(self):
+        types = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+        pack = obj.packs_list[0]
+        idx_path = obj.get_idx_of_pack(pack)
+        lines = popen(
+            f'git -C {self.temp} cat-file --batch-all-objects --batch-check'
+        ).decode().splitlines()
+
+        for line in lines:
+            hash_, type_, size = line.split()
+            offset = obj.search_idx(idx_path, hash_)
+            tested = obj.get_header_by_offset(pack, offset)
+            self.assertEqual((types[tested[0]], tested[1]), (type_, int(size)))
+
+    def test_inflate_incompressible(self):
+        content = os.urandom(100_000)
+        data = b'head' + zlib.compress(content) + b'tail'
+
+        tested, end = objects.inflate(data, 4, len(content))
+        self.assertEqual(tested, content)
+        self.assertEqual(data[end:], b'tail')
+        tested, _ = objects.inflate(data, 4, limit=10)
+        self.assertEqual(tested, content[:10])
+
+
+class TestGitstatusCommitGraph(unittest.TestCase):
+    """
+    Tests for commitgraph module, single file and split chain.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        for i in range(3):
+            ni(cls.temp, f'file{i}')
+            popen(f'git -C {cls.temp} add .')
+            popen(f'git -C {cls.temp} commit -m "{i}"')
+        popen(f'git -C {cls.temp} commit-graph write --reachable')
+        obj.init(cls.temp, 'master')
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def rev_parse(self, rev):
+        return popen(f'git -C {self.temp} rev-parse {rev}').decode().strip()
+
+    def test_commit_graph(self):
+        graph = obj.get_commit_graph()
+        head = graph.find(bytes.fromhex(self.rev_parse('HEAD')))
+
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(
+            graph.get_tree(head).hex(), self.rev_parse('HEAD^{tree}')
+        )
+        self.assertEqual(graph.get_generation(head), 3)
+        parents = graph.get_parents(head)
+        self.assertEqual(
+            [graph.get_sha(i).hex() for i in parents],
+            [self.rev_parse('HEAD~1')]
+        )
+        self.assertEqual(graph.get_parents(graph.find(
+            bytes.fromhex(self.rev_parse('HEAD~2'))
+        )), [])
+        self.assertEqual(graph.find(bytes(20)), -1)
+
+    def test_commit_graph_chain(self):
+        ni(self.temp, 'file3')
+        popen(f'git -C {self.temp} add .')
+        popen(f'git -C {self.temp} commit -m "3"')
+        # the single file becomes the base of the chain
+        popen(
+            f'git -C {self.temp} commit-graph write --reachable '
+            '--split=no-merge'
+        )
+
+        graph = obj.get_commit_graph()
+        self.assertEqual([len(i) for i in graph.layers], [3, 1])
+        self.assertEqual(
+            obj.get_commit_tree_hash(self.rev_parse('HEAD')),
+            self.rev_parse('HEAD^{tree}')
+        )
+
+    def test_commit_graph_closed_after_status(self):
+        graph = obj.get_commit_graph()
+        self.assertIsNotNone(graph)
+
+        interface._populate_status()
+        self.assertEqual(obj.commit_graphs, {})
+        for path in graph.paths:
+            self.assertNotIn(path, obj.maps)
+            # as `commit-graph write` and gc do
+            os.replace(path, path + '.old')
+            os.replace(path + '.old', path)
+
+
 class TestGitstatusHighStatus(unittest.TestCase):
     """
     Tests for high module with just initialized git repo.
@@ -572,7 +925,7 @@ class TestGitstatusHighStatus(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status(self):
@@ -635,7 +988,7 @@ class TestGitstatusHighStatusIgnore(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status_ignore(self):
@@ -699,7 +1052,7 @@ class TestGitstatusInit(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_gitstatus(self):
@@ -719,6 +1072,113 @@ class TestGitstatusInit(unittest.TestCase):
         self.assertEqual(tested, ('main', '?1'))
 
 
+class TestGitstatusSelector(unittest.TestCase):
+    """
+    Tests for the choice of backend by repo.
+    """
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        self.path = os.path.join(self.temp, 'backends')
+
+    def tearDown(self):
+        os.system(f'rmdir /s /q {self.temp}')
+
+    def test_selector_routes_failed_to_git(self):
+        sel = selector.Selector(self.path)
+        self.assertEqual(sel.choose('repo'), selector.NATIVE)
+
+        sel.record('repo', selector.NATIVE, 1, 'index too big')
+        self.assertEqual(sel.choose('repo'), selector.GIT)
+        sel.record('repo', selector.GIT, 50)
+        self.assertEqual(sel.choose('repo'), selector.GIT)
+
+    def test_selector_probes_and_picks_fastest(self):
+        sel = selector.Selector(self.path, probe_every=4)
+        sel.record('repo', selector.NATIVE, 1, 'index too big')
+        sel.record('repo', selector.GIT, 50)
+
+        chosen = [sel.choose('repo') for _ in range(4)]
+        self.assertEqual(chosen[-1], selector.NATIVE)
+
+        sel.record('repo', selector.NATIVE, 10)
+        self.assertEqual(sel.choose('repo'), selector.NATIVE)
+
+    def test_selector_tries_every_backend(self):
+        sel = selector.Selector(self.path, probe_every=4)
+        sel.record('repo', selector.NATIVE, 500)
+        # not kept on native until the next probe
+        self.assertEqual(sel.choose('repo'), selector.GIT)
+        sel.record('repo', selector.GIT, 50)
+        self.assertEqual(sel.choose('repo'), selector.GIT)
+
+        # the count to the next probe goes with the repo
+        self.assertEqual(sel.repos.get('repo').calls, 1)
+        sel.repos.clear()
+        self.assertEqual(sel.choose('repo'), selector.NATIVE)
+
+    def test_selector_persists(self):
+        sel = selector.Selector(self.path)
+        sel.record('repo', selector.NATIVE, 1, 'index too big')
+        sel.record('repo', selector.GIT, 50)
+        sel.save(force=True)
+
+        loaded = selector.Selector(self.path)
+        self.assertEqual(loaded.choose('repo'), selector.GIT)
+        self.assertEqual(
+            loaded.repos.get('repo')[selector.NATIVE].reason,
+            'index too big'
+        )
+
+
+class TestGitstatusCache(unittest.TestCase):
+    """
+    Tests for the bounded caches.
+    """
+
+    def test_cache_evicts_by_budget(self):
+        evicted = []
+        tested = cache.LRUCache(
+            'test', 2, 10, on_evict=lambda k, v: evicted.append(k)
+        )
+        tested.put('a', 1, 4)
+        tested.put('b', 2, 4)
+        tested.get('a')
+        tested.put('c', 3, 4)
+
+        self.assertEqual(evicted, ['b'])
+        self.assertEqual([i[0] for i in tested.items()], ['a', 'c'])
+        self.assertEqual(tested.bytes, 8)
+        self.assertIn('test: 2/2 entries, 8/10 bytes', cache.report())
+
+    def test_cache_trims_idle(self):
+        tested = cache.LRUCache('test', 8, max_idle=60)
+        tested.put('a', 1)
+        self.assertEqual(tested.trim(), 0)
+        self.assertEqual(tested.trim(max_idle=-1), 1)
+        self.assertEqual(len(tested), 0)
+
+    def test_forget_repo(self):
+        temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {temp}')
+        ni(temp, 'file.txt')
+        popen(f'git -C {temp} add .')
+        popen(f'git -C {temp} commit -m "some"')
+        popen(f'git -C {temp} gc')
+
+        obj.init(temp, 'master')
+        obj.status()
+        self.assertIn(temp, obj.packs_lists)
+        self.assertTrue(obj.maps)
+
+        obj.repos.trim(max_idle=-1)
+        self.assertNotIn(temp, obj.packs_lists)
+        self.assertNotIn(temp, obj.index_cache)
+        self.assertFalse(obj.maps)
+
+        os.system(f'rmdir /s /q {temp}')
+
+
 class TestGitstatusPygit2(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -728,7 +1188,7 @@ class TestGitstatusPygit2(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_pygit2_full_routine(self):
@@ -770,7 +1230,7 @@ class TestGitstatusTDD0(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status(self):
@@ -791,7 +1251,7 @@ class TestGitstatusTDD1(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status_ignore(self):
@@ -815,7 +1275,7 @@ class TestGitstatusTDD2(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status_ignore(self):
@@ -889,7 +1349,7 @@ class TestGitstatusTDD3(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status_ignore(self):
@@ -913,7 +1373,7 @@ class TestGitstatusTDD4(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_modified_after_commit(self):
@@ -928,7 +1388,7 @@ class TestGitstatusTDD4(unittest.TestCase):
         git = obj.parse_git_status()
         self.assertEqual(git, 'M1')
         tested = obj.status()
-        self.assertEqual(tested, 'm1')
+        self.assertEqual(tested, '+1')
 
 
 class TestGitstatusTDD5(unittest.TestCase):
@@ -940,7 +1400,7 @@ class TestGitstatusTDD5(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_status_handle_untracked_dir(self):
@@ -973,7 +1433,7 @@ class TestGitstatusTDD6(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_nested_gitignore(self):
@@ -1003,7 +1463,7 @@ class TestGitstatusTDD7(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_initial_slash_on_gitignore(self):
@@ -1029,7 +1489,7 @@ class TestGitstatusTDD8(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test_brackets_on_gitignore(self):
@@ -1055,7 +1515,7 @@ class TestGitstatusTDD9(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        obj._write_buffer()
+        obj.close_packs()
         os.system(f'rmdir /s /q {cls.temp}')
 
     def test(self):
@@ -1067,5 +1527,157 @@ class TestGitstatusTDD9(unittest.TestCase):
         self.assertEqual(obj.status(), "+1 x1")
 
 
+class TestGitstatusTDD10(unittest.TestCase):
+    "Test if skip-worktree file removed from disk is not marked as deleted"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        obj.init(cls.temp, 'master')
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def test(self):
+        ni(self.temp, "some_file.txt")
+        ni(self.temp, "other_file.txt")
+        popen(f"git -C {self.temp} add .")
+        popen(f'git -C {self.temp} commit -m "some"')
+        popen(
+            f"git -C {self.temp} update-index --skip-worktree some_file.txt"
+        )
+        os.remove(f"{self.temp}\\some_file.txt")
+        self.assertIsNone(obj.parse_git_status())
+        self.assertIsNone(obj.status())
+
+
+class TestGitstatusDirtyOnly(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        obj.init(cls.temp, 'master')
+        obj.dirty_only = True
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.dirty_only = False
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def test_dirty_only(self):
+        ni(self.temp, 'dir/file')
+        popen(f'git -C {self.temp} add .')
+        popen(f'git -C {self.temp} commit -m "some"')
+        self.assertIsNone(obj.parse_git_status())
+        self.assertIsNone(obj.status())
+
+        # only found by the second git command
+        ni(self.temp, 'other/file')
+        self.assertEqual(obj.parse_git_status(), '*')
+        self.assertEqual(obj.status(), '*')
+
+        os.remove(f'{self.temp}\\dir\\file')
+        self.assertEqual(obj.parse_git_status(), '*')
+        self.assertEqual(obj.status(), '*')
+
+
+class TestGitstatusThreaded(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        obj.init(cls.temp, 'master')
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.threaded = False
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def test_threaded(self):
+        for i in range(20):
+            ni(self.temp, f'dir{i}/sub/file')
+            ni(self.temp, f'dir{i}/file')
+        popen(f'git -C {self.temp} add .')
+        popen(f'git -C {self.temp} commit -m "some"')
+        for i in range(0, 20, 3):
+            os.remove(f'{self.temp}\\dir{i}\\sub\\file')
+            ni(self.temp, f'dir{i}/sub/other')
+        with open(f'{self.temp}\\dir1\\file', 'w') as file:
+            file.write('changed')
+
+        expected = obj.status()
+        self.assertEqual(expected, '?7 m1 x7')
+        obj.threaded = True
+        self.assertEqual(obj.status(), expected)
+        self.assertIsNotNone(obj.pool)
+        # the counters are summed and reset, nothing left in progress
+        self.assertIsNone(obj.running_walk)
+        self.assertIsNone(obj.get_partial_status())
+
+        # its threads end once the mode is off
+        obj.threaded = False
+        self.assertEqual(obj.status(), expected)
+        self.assertIsNone(obj.pool)
+
+
+class TestGitstatusCancel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.mkdtemp(prefix='shellserver_test_')
+        popen(f'git init {cls.temp}')
+        obj.init(cls.temp, 'master')
+
+    @classmethod
+    def tearDownClass(cls):
+        obj.threaded = False
+        obj.set_deadline(None)
+        obj.close_packs()
+        os.system(f'rmdir /s /q {cls.temp}')
+
+    def test_cancel(self):
+        ni(self.temp, 'file')
+        for threaded in (False, True):
+            obj.threaded = threaded
+            obj.cancel()
+            with self.assertRaises(high.CancelledError):
+                obj.status()
+            obj.set_deadline(None)
+            self.assertEqual(obj.status(), '?1')
+
+    def test_deadline(self):
+        for i in range(5):
+            ni(self.temp, f'dir{i}/file')
+        obj.set_deadline(0)
+        with self.assertRaises(high.CancelledError) as raised:
+            obj.status()
+        # stopped before the first directory
+        self.assertIsNone(raised.exception.partial)
+
+        obj.set_deadline(60)
+        self.assertEqual(obj.status(), '?6')
+
+
+class TestGitstatusMultiprocWire(unittest.TestCase):
+    def test_encode_task(self):
+        task = ('dir/sub dir', ['dir/*.log', 'build/'], ['*.tmp'])
+        self.assertEqual(high.decode_task(high.encode_task(*task)), task)
+
+        task = ('dir', [], [])
+        self.assertEqual(high.decode_task(high.encode_task(*task)), task)
+
+    def test_result_fits_big_counts(self):
+        counts = (70_000, 0, 2 ** 40, -3)
+        packed = high.RESULT.pack(high.MemFlag.WORKER_RES, *counts)
+        self.assertEqual(
+            high.RESULT.unpack(packed),
+            (high.MemFlag.WORKER_RES, *counts)
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
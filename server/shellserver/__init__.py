@@ -5,4 +5,5 @@ SEP = os.path.sep
 USER_HOME = os.path.expanduser('~')
 APP_HOME = os.environ['LOCALAPPDATA'] + SEP + 'ShellServer'
 CACHE_PATH = APP_HOME + SEP + 'ShellServerCache'
+BACKENDS_PATH = APP_HOME + SEP + 'GitstatusBackends'
 CONFIG_PATH = os.path.expanduser('~/.shellserver.toml')
@@ -36,7 +36,7 @@ def send(msg: bytes):
 def clear():
     import os
 
-    for file in ('ShellServerCache', 'traceback'):
+    for file in ('ShellServerCache', 'GitstatusBackends', 'traceback'):
         file_path = os.path.join(APP_HOME, file)
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -1,25 +1,60 @@
 import hashlib
 import os
 import subprocess
+import time
 import zlib
+from typing import Any, Iterable
 
+from . import cache
+from . import commitgraph
+from . import index
+from . import objects
 from . import packs
 from . import plugins
+from . import refs
 from .plugins import HAS_SSD_CHECKER, DRIVE_SSD_MAP
 
+# the whole status with dirty_only, for any change
+DIRTY = '*'
+
 
 class IndexTooBigError(Exception):
     pass
 
 
+class UnsupportedIndexError(Exception):
+    pass
+
+
 class Base(packs.Packs):
     # {git_dir: repo}
-    pygit2_repos: dict[str, plugins.pygit2.Repository] = {}
+    pygit2_repos: cache.LRUCache[str, plugins.pygit2.Repository] = (
+        cache.LRUCache('pygit2 repos', 16)
+    )
+    # {path of a .gitignore: (lines, hash)} stamped with its stat, kept
+    # across statuses by main and by the workers
+    gitignore_cache: cache.LRUCache[str, tuple[list[str], str]] = (
+        cache.LRUCache('gitignores', 4096, 16 * 1024 * 1024)
+    )
+    # {git_dir: (mtime of the pack directory, packs_list)}
+    packs_lists: dict[str, tuple[int, list[str]]] = {}
+    # {git_dir: (mtimes of the commit-graph files, graph)}
+    commit_graphs: dict[
+        str, tuple[tuple[int, int], commitgraph.CommitGraph | None]
+    ] = {}
     git_dir: str
     branch: str
-    index_tracked: dict[str, float]
+    git_index: index.ParsedIndex
+    index_tracked: dict[str, index.IndexEntry]
+    index_mtime_ns: int
     relative: list[str]
     fallback: bool
+    dirty_only: bool
+    output: Any
+    # {git_dir: git_index, shared index path: its entries in order}
+    index_cache: cache.LRUCache[
+        str, index.ParsedIndex | list[tuple[str, index.IndexEntry]]
+    ]
 
     # dropped __slots__
 
@@ -29,10 +64,24 @@ class Base(packs.Packs):
     def set_packs(self) -> None:
         """
         Sets the `packs_list` attribute.
+        The list is kept while the pack directory keeps its mtime,
+        packs that left it are unmapped.
         return: None.
         """
         # info/packs is not needed
         pack_def_path = '.git/objects/pack'
+        packs = os.path.join(self.git_dir, pack_def_path)
+
+        try:
+            mtime = os.stat(packs).st_mtime_ns
+        except OSError:
+            self.packs_list = []
+            return
+
+        cached = self.packs_lists.get(self.git_dir)
+        if cached is not None and cached[0] == mtime:
+            self.packs_list = cached[1]
+            return
 
         packs_list = self.get_info_packs_content()
         if packs_list:
@@ -41,25 +90,116 @@ class Base(packs.Packs):
                     self.git_dir, pack_def_path, i
                 ) for i in packs_list
             ]
-            return
-
-        packs = os.path.join(self.git_dir, pack_def_path)
-        if not os.path.exists(packs):
-            self.packs_list = []
-            return
 
-        dir_ = os.scandir(packs)
-        self.packs_list = [
-            i.path for i in dir_ if i.name.endswith('.pack')
-        ]
+        else:
+            dir_ = os.scandir(packs)
+            self.packs_list = [
+                i.path for i in dir_ if i.name.endswith('.pack')
+            ]
 
-    def set_index_tracked(self) -> None:
-        """
-        Sets `index_tracked` attribute.
-        Modified and simpler version of gin.
-        https://github.com/sbp/gin
+        if cached is not None:
+            self.close_packs(set(cached[1]).difference(self.packs_list))
+            # a multi-pack-index may have been written for the same packs
+            self.close_multi_index(packs)
+        self.packs_lists[self.git_dir] = mtime, self.packs_list
+
+    def get_commit_graph(self) -> commitgraph.CommitGraph | None:
+        """
+        Gets the commit-graph of the repo, from the single file or else
+        from the chain of split ones. It is read again when they change
+        and after each status, as `close_packs` unmaps it for git to
+        rewrite.
+        return: CommitGraph | None: The graph, None if there is none.
+        """
+        info = os.path.join(self.git_dir, '.git/objects/info')
+        single = os.path.join(info, 'commit-graph')
+        graphs_dir = os.path.join(info, 'commit-graphs')
+        chain = os.path.join(graphs_dir, 'commit-graph-chain')
+
+        mtimes = []
+        for path in (single, chain):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(0)
+        key = mtimes[0], mtimes[1]
+
+        cached = self.commit_graphs.get(self.git_dir)
+        if cached is not None:
+            if cached[0] == key:
+                return cached[1]
+            if cached[1] is not None:
+                for path in cached[1].paths:
+                    self._close_buffer(path)
+
+        paths = []
+        if key[0]:
+            paths = [single]
+        elif key[1]:
+            with open(chain) as in_file:
+                paths = [
+                    os.path.join(graphs_dir, f'graph-{i}.graph')
+                    for i in commitgraph.read_chain(in_file.read())
+                ]
+
+        graph = None
+        if paths:
+            try:
+                graph = commitgraph.CommitGraph([
+                    commitgraph.GraphLayer(self._get_buffer(i), i)
+                    for i in paths
+                ])
+            # rewritten by git meanwhile or an unknown version
+            except (OSError, ValueError):
+                for path in paths:
+                    self._close_buffer(path)
+
+        self.commit_graphs[self.git_dir] = key, graph
+        return graph
+
+    def forget_repo(self, git_dir: str) -> None:
+        """
+        Drops what is kept of a repository: its mapped files, parsed
+        indexes, .gitignore files and pygit2 handle.
+        """
+        cached = self.packs_lists.pop(git_dir, None)
+        if cached is not None:
+            self.close_packs(cached[1])
+        self.close_multi_index(os.path.join(git_dir, '.git/objects/pack'))
+
+        graph = self.commit_graphs.pop(git_dir, None)
+        if graph is not None and graph[1] is not None:
+            for path in graph[1].paths:
+                self._close_buffer(path)
+
+        self.index_cache.pop(git_dir)
+        self.pygit2_repos.pop(git_dir)
+
+        prefix = os.path.join(git_dir, '')
+        for path, _ in self.gitignore_cache.items():
+            if path.startswith(prefix):
+                self.gitignore_cache.pop(path)
+
+    def close_packs(self, packs: Iterable[str] | None = None) -> None:
+        if packs is None:
+            # their files are mapped too
+            self.commit_graphs.clear()
+        super().close_packs(packs)
+
+    def set_index_tracked(self, fallback: bool | None = None) -> None:
+        """
+        Sets `git_index` and `index_tracked` attributes.
+        Reads the index once and parses it with `index.parse_entries`.
+        The result is kept in `index_cache` while the index file
+        keeps its stat identity.
+        Also sets `index_mtime_ns` to tell racily clean entries.
+        param `fallback`: Raise IndexTooBigError for big indexes,
+                          `self.fallback` if None.
         return: None.
         """
+        if fallback is None:
+            fallback = self.fallback
+
         max_entries = 1000
         if HAS_SSD_CHECKER:
             for drive in DRIVE_SSD_MAP:
@@ -71,64 +211,162 @@ class Base(packs.Packs):
                     break
 
         index_path = os.path.join(self.git_dir, '.git/index')
-        if not os.path.exists(index_path):
-            self.index_tracked = {}
+        init = time.perf_counter()
+
+        try:
+            st = os.stat(index_path)
+        except FileNotFoundError:
+            self.set_empty_index()
+            return
+
+        self.index_mtime_ns = st.st_mtime_ns
+
+        # git replaces the index through a lock file,
+        # every write gets a new inode
+        stamp = st.st_mtime_ns, st.st_size, st.st_ino
+        cached = self.index_cache.get(self.git_dir, stamp)
+        if cached is not None:
+            assert isinstance(cached, index.ParsedIndex)
+            if fallback and len(cached) > max_entries:
+                raise IndexTooBigError
+
+            self.git_index = cached
+            self.index_tracked = cached.entries
+            self.output.write(f'Index gotten from {self.index_cache}\n')
             return
 
-        with open(index_path, 'rb') as f:
+        # read at once and not mmaped: git can't replace
+        # a mapped file on Windows
+        try:
+            with open(index_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.set_empty_index()
+            return
 
-            def read_str_until(delim: bytes) -> str:
-                ret: list[bytes] = []
-                while True:
-                    b = f.read(1)
-                    if b == b'' or b == delim:
-                        return b"".join(ret).decode()
+        header = index.read_header(data)
+        if header is None:
+            self.set_empty_index()
+            return
 
-                    ret.append(b)
+        version, entries = header
 
-            constant = f.read(4)
-            version = int.from_bytes(f.read(4), 'big')
-            if constant != b'DIRC' or version not in (2, 3):
-                self.index_tracked = {}
-                return
+        if fallback and entries > max_entries:
+            raise IndexTooBigError
 
-            entries = int.from_bytes(f.read(4), 'big')
+        replacements: list[index.IndexEntry] = []
+        index_tracked, pos = index.parse_entries(
+            data, version, entries, replacements
+        )
+        extensions = index.read_extensions(data, pos)
 
-            if self.fallback and entries > max_entries:
+        if b'link' in extensions:
+            index_tracked = self.merge_shared_index(
+                extensions[b'link'], index_tracked, replacements
+            )
+            if fallback and len(index_tracked) > max_entries:
                 raise IndexTooBigError
 
-            res = {}
+        self.git_index = index.ParsedIndex(version, index_tracked, extensions)
+        self.index_tracked = index_tracked
+        self.index_cache.put(
+            self.git_dir, self.git_index, size=len(data), stamp=stamp
+        )
 
-            for entry in range(entries):
-                f.read(8)
-                # converted to float to keep type consistence
-                mtime = float(int.from_bytes(f.read(4), 'big'))
-                mtime += int.from_bytes(f.read(4), 'big') / 1000000000
-                f.read(44)
+        took = round((time.perf_counter() - init) * 1000, 3)
+        self.output.write(
+            f'Index v{version} with {len(index_tracked)} entries '
+            f'parsed in {took}ms\n'
+        )
+
+    def merge_shared_index(
+        self,
+        link: bytes,
+        entries: dict[str, index.IndexEntry],
+        replacements: list[index.IndexEntry]
+    ) -> dict[str, index.IndexEntry]:
+        """
+        Gets the entries of a split index applied over its shared index.
+        The shared index is kept in `index_cache`, its file is never
+        rewritten.
+        param `link`: The content of the link extension.
+        return: dict: {relpath: IndexEntry}
+        """
+        shared_hash, delete, replace = index.parse_link(link)
+        shared_path = os.path.join(
+            self.git_dir, '.git', f'sharedindex.{shared_hash}'
+        )
 
-                flags = int.from_bytes(f.read(2), 'big')
-                namelen = flags & 0xfff
-                extended = flags & 16384  # 0b0100_0000 << 8
+        shared = self.index_cache.get(shared_path)
+        if shared is None:
+            try:
+                with open(shared_path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                raise UnsupportedIndexError
+
+            header = index.read_header(data)
+            if header is None:
+                raise UnsupportedIndexError
+
+            # the bitmaps address entries by position
+            shared = []
+            index.parse_entries(data, *header, in_order=shared)
+            self.index_cache.put(shared_path, shared, size=len(data))
+            self.output.write(f'Shared index {shared_hash} parsed\n')
+
+        assert isinstance(shared, list)
+        return index.merge_split_index(
+            shared, entries, replacements, delete, replace
+        )
 
-                entrylen = 62
+    def set_empty_index(self) -> None:
+        self.git_index = index.ParsedIndex(0, {}, {})
+        self.index_tracked = self.git_index.entries
+        self.index_mtime_ns = 0
 
-                if extended:
-                    f.read(2)
-                    entrylen += 2
+    def check_untracked_cache(self, uc: index.UntrackedCache) -> bool:
+        """
+        Checks if the untracked cache was written for this worktree with
+        the flags and the exclude files that `git status` would use.
+        """
+        # DIR_SHOW_OTHER_DIRECTORIES | DIR_HIDE_EMPTY_DIRECTORIES
+        if uc.dir_flags != 6 or uc.exclude_per_dir != '.gitignore':
+            return False
 
-                if namelen < 0xfff:
-                    name = f.read(namelen).decode()
-                    entrylen += namelen
-                else:
-                    name = read_str_until(b'\x00')
-                    entrylen += 1
+        # 'Location <worktree>, system <sysname>'
+        git_dir = os.path.normcase(os.path.normpath(self.git_dir))
+        for ident in uc.idents:
+            location = ident.removeprefix('Location ').rpartition(', ')[0]
+            if os.path.normcase(os.path.normpath(location)) == git_dir:
+                break
+        else:
+            return False
 
-                res[name] = mtime
+        config_home = (
+            os.environ.get('XDG_CONFIG_HOME')
+            or os.path.expanduser('~/.config')
+        )
+        for path, recorded in (
+            (os.path.join(self.git_dir, '.git/info/exclude'),
+             uc.info_exclude),
+            # default core.excludesFile
+            (os.path.join(config_home, 'git/ignore'), uc.excludes_file),
+        ):
+            try:
+                st = os.stat(path)
+            except OSError:
+                if recorded.mtime_s:
+                    return False
+                continue
 
-                padlen = (8 - (entrylen % 8)) or 8
-                f.read(padlen)
+            if (
+                not index.stat_matches(recorded, st)
+                or index.is_racy(recorded, self.index_mtime_ns)
+            ):
+                return False
 
-        self.index_tracked = res
+        return True
 
     def get_split_ignored(
         self, raw_ignored: list[str], prepend: None | str = None
@@ -164,17 +402,42 @@ class Base(packs.Packs):
     def get_content_by_hash_packed(self, hash_: str) -> bytes | None:
         """
         Gets the content of an object by its hash in any packfiles present.
+        The index over many packs is looked up first, the packs it doesn't
+        cover one by one.
         param `hash_`: The hash to be searched in packfiles.
         return: bytes | None: The content of object, None if it was not Found.
         """
         content = None
+        packs_list = self.packs_list
 
-        for pack in self.packs_list:
+        multi_index = self.get_multi_index(
+            os.path.join(self.git_dir, '.git/objects/pack'), packs_list
+        )
+        if multi_index is not None:
+            try:
+                found = multi_index.lookup(bytes.fromhex(hash_))
+                if found is None:
+                    packs_list = [
+                        i for i in packs_list if i not in multi_index.packs
+                    ]
+                else:
+                    content = self.get_content_by_offset(*found)
+                    if content:
+                        return content
+            # a pack of the midx removed by git meanwhile
+            except (OSError, ValueError, zlib.error):
+                pass
+
+        for pack in packs_list:
             idx = self.get_idx_of_pack(pack)
-            offset = self.search_idx(idx, hash_)
-            if offset is None:
+            try:
+                offset = self.search_idx(idx, hash_)
+                if offset is None:
+                    continue
+                content = self.get_content_by_offset(pack, offset)
+            # removed by git meanwhile or an old idx version
+            except (OSError, ValueError, zlib.error):
                 continue
-            content = self.get_content_by_offset(pack, offset)
             if content:
                 break
 
@@ -182,34 +445,22 @@ class Base(packs.Packs):
 
     def get_last_commit_packed(self) -> str | None:
         """
-        Gets the last commit's hash of a git repo by a packed perspective.
+        Gets the last commit's hash of a git repo from packed-refs.
         return: str | None: String of the last commit hash, None if there's no
                             last commit packed.
         """
-        info_refs = self.get_info_refs_content()
-        last_commt_hash = None
-
-        target = f'refs/heads/{self.branch}'
-        for line in info_refs:
-            a, b = line.strip().split()
-            if b == target:
-                last_commt_hash = a
-                break
-
-        return last_commt_hash
+        return refs.get_packed_refs(self.git_dir).get(
+            refs.HEADS + self.branch
+        )
 
     def get_last_commit_hash(self) -> str | None:
         """
-        Gets the last commit's hash of a git repo.
+        Gets the last commit's hash of a git repo, the loose ref of the
+        branch, following symbolic refs, or else the packed one.
         return: str | None: String of the last commit hash, None if there's no
                             last commit.
         """
-        last_cmmt = self.get_last_commit_loose()
-
-        if last_cmmt is None:
-            last_cmmt = self.get_last_commit_packed()
-
-        return last_cmmt
+        return refs.resolve(self.git_dir, refs.HEADS + self.branch)
 
     def get_ignored_lists(
         self,
@@ -292,60 +543,60 @@ class Base(packs.Packs):
         Searhes for a .gitignore in the same level of `dir_path`.
         return: list: Content of .gitignore by line.
         """
+        gitignore = self.get_gitignore(dir_path)
+        return [] if gitignore is None else gitignore[0].copy()
 
-        gitignore = os.path.join(dir_path, '.gitignore')
-        if not os.path.exists(gitignore):
-            return []
+    def get_gitignore_hash(self, dir_path: str) -> str | None:
+        """
+        return: str | None: The hash of the raw .gitignore of `dir_path`,
+                            as recorded by the untracked cache, None if
+                            there's no .gitignore.
+        """
+        gitignore = self.get_gitignore(dir_path)
+        return None if gitignore is None else gitignore[1]
 
-        with open(gitignore) as in_file:
-            content = in_file.readlines()
+    def get_gitignore(self, dir_path: str) -> tuple[list[str], str] | None:
+        """
+        Reads the .gitignore of `dir_path` only when its stat changed.
+        return: tuple | None: Its stripped lines, without the blank ones,
+                              and its hash. None if there's no .gitignore.
+        """
+        path = os.path.join(dir_path, '.gitignore')
+        try:
+            st = os.stat(path)
+            stamp = st.st_mtime_ns, st.st_size
+            cached = self.gitignore_cache.get(path, stamp)
+            if cached is not None:
+                return cached
 
-        counter = 0
-        while counter < len(content):
-            test = content[counter].strip()
-            if not test:
-                del content[counter]
-                continue
+            with open(path, 'rb') as in_file:
+                data = in_file.read()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
 
-            content[counter] = test
-            counter += 1
+        lines = [
+            line.strip()
+            for line in data.decode(errors='replace').splitlines()
+            if line.strip()
+        ]
+        # same as git does for the untracked cache
+        hash_ = hashlib.sha1(f'blob {len(data)}\x00'.encode() + data)
+        gitignore = lines, hash_.hexdigest()
+        self.gitignore_cache.put(path, gitignore, len(data), stamp=stamp)
 
-        return content
+        return gitignore
 
     def get_last_commit_loose(self) -> str | None:
         """
-        Gets the last commit's hash of a git repo.
+        Gets the last commit's hash of a git repo from the loose ref.
         return: str | None: String of the last commit hash, None if there's no
                             last commit.
         """
 
-        head_path = os.path.join(
-            self.git_dir, f'.git/refs/heads/{self.branch}'
-        )
-
-        if not os.path.exists(head_path):
+        content = refs.read_loose(self.git_dir, refs.HEADS + self.branch)
+        if content is None or content.startswith(refs.SYMREF):
             return None
 
-        with open(head_path) as file:
-            return file.read().strip()
-
-    def get_info_refs_content(self) -> list[str]:
-        """
-        Checks the existence of a 'refs' file in .git/info
-        and return its content
-        return: list: Content of 'refs' by line.
-        """
-
-        refs = os.path.join(self.git_dir, '.git/info/refs')
-        if not os.path.exists(refs):
-            return []
-
-        with open(refs) as in_file:
-            content = in_file.readlines()
-
-        for ind in range(len(content)):
-            content[ind] = content[ind].strip()
-
         return content
 
     def get_exclude_content(self) -> list[str]:
@@ -403,27 +654,47 @@ class Base(packs.Packs):
 
         return hash_
 
-    def get_content_by_hash_loose(self, hash_: str) -> bytes | None:
+    def get_content_by_hash_loose(
+            self, hash_: str, limit: int = 0
+    ) -> bytes | None:
         """
         Get the content of a loose file by its hash.
         param `hash`: The hash gotten from `get_hash_of_file` for files in repo
                       or in git files.
+        param `limit`: Bytes wanted from the start, header included,
+                       0 for the whole object. Only those are inflated.
         return: bytes | None: The content of file, None if it was not found.
         """
 
         path = os.path.join(
             self.git_dir, f'.git/objects/{hash_[:2]}/{hash_[2:]}'
         )
-        if not os.path.exists(path):
+        try:
+            with open(path, 'rb') as in_file:
+                data = in_file.read()
+        except OSError:
             return None
 
-        with open(path, 'rb') as in_file:
-            content = in_file.read()
-
         # cannot decode here
         # in blob we can take bytes or str
         # in tree, only bytes
-        return zlib.decompress(content)
+        return objects.inflate(data, 0, len(data) * 4, limit)[0]
+
+    def get_header_by_hash_loose(self, hash_: str) -> tuple[str, int] | None:
+        """
+        Gets the type and the size of a loose object, only its header
+        is inflated.
+        return: tuple | None: The type and the size, None if it was not
+                              found.
+        """
+        data = self.get_content_by_hash_loose(
+            hash_, objects.LOOSE_HEADER_MAX
+        )
+        if data is None:
+            return None
+
+        type_, size, _ = objects.parse_loose_header(data)
+        return type_, size
 
     def get_tree_hash_from_commit(self, cmmt_obj: bytes) -> str:
         """
@@ -438,20 +709,28 @@ class Base(packs.Packs):
         return tree_hash
 
     def get_status_string(
-            self, status: tuple[int, int, int, int]
+            self, status: tuple[int, int, int, int], partial: bool = False
     ) -> str | None:
         """
         Get the string version of given Git status
         param `status`: tuple: untracked, staged, modified and deleted sums.
+        param `partial`: The sums are of a status not finished, each one
+                         gets a '+' as it may be bigger.
         return: str | None: String of status, None if not any value is above 0.
+                            Only `DIRTY` with dirty_only.
         """
         if not any(status):
             return None
 
+        # a change found is the whole answer
+        if self.dirty_only:
+            return DIRTY
+
         symbols = ('?', '+', 'm', 'x')
+        suffix = '+' if partial else ''
 
         return ' '.join(
-            symb + str(stat)
+            symb + str(stat) + suffix
             for symb, stat in zip(symbols, status)
             if stat
         )
@@ -462,6 +741,9 @@ class Base(packs.Packs):
         modified and deleted sums.
         return: str: String of status, empty string for nothing to report.
         """
+        if self.dirty_only:
+            return self.parse_git_dirty()
+
         out, err = subprocess.Popen(
             ['git', '-C', self.git_dir,
              '--no-optional-locks', 'status', '--porcelain'],
@@ -480,59 +762,68 @@ class Base(packs.Packs):
         ret_value = ' '.join(res)
         return ret_value if ret_value else None
 
-    def parse_tree_object(
-        self, data: bytes, from_pack: bool = False
-    ) -> list[tuple[str, str, str]]:
+    def parse_git_dirty(self) -> str | None:
         """
-        Parses the content of a git tree object and returns a list
-        of its values
-        param `data`: The content decompressed of tree object
-        return: list: list of tuples containing the type, hash and
-                the filename in tree.
+        Asks git only if there's any change. The untracked files, the
+        slowest to find, are searched only without changes to tracked ones.
+        return: str | None: `DIRTY`, None for nothing to report.
         """
+        if self.get_git_first_line(
+            'status', '--porcelain', '--untracked-files=no'
+        ) or self.get_git_first_line(
+            'ls-files', '--others', '--exclude-standard',
+            '--directory', '--no-empty-directory'
+        ):
+            return DIRTY
 
-        if not from_pack:
-            if not data[data.index(b'\x00') + 1:]:
-                return []
-
-            # first remove everything before first null byte
-            start = data.index(b'\x00') + 1
-        else:
-            start = 0
-
-        res = []
-
-        while True:
-            # cant split(b'\x00), hash might have it
-            # cant split(' '), filename might have it
-            stop = data.index(b'\x00', start)
-
-            piece = data[start: stop]
-            sep = piece.index(b' ')
-
-            type_ = piece[:sep]
-            filename = piece[sep + 1:]
+        return None
 
-            start = stop + 21  # next start
-
-            hexa = data[stop + 1:start]
-            hexa_str = f'{int.from_bytes(hexa, "big"):x}'.zfill(40)
+    def get_git_first_line(self, *args: str) -> bytes:
+        """
+        Runs a git command in the repo, killed once it outputs a line.
+        return: bytes: The first line, empty if there was no output.
+        """
+        proc = subprocess.Popen(
+            ['git', '-C', self.git_dir, '--no-optional-locks', *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW
+        )
+        assert proc.stdout is not None
 
-            res.append((type_.decode(), hexa_str, filename.decode()))
+        line = proc.stdout.readline()
+        if line:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
 
-            if not data[start + 1:]:
-                break
+        return line
 
-        return res
+    def parse_tree_object(
+        self, data: bytes, from_pack: bool = False
+    ) -> objects.Tree:
+        """
+        Parses the content of a git tree object.
+        param `data`: The content decompressed of tree object
+        param `from_pack`: `data` has no header, as in packs.
+        return: Tree: Its entries by name.
+        """
+        start = 0 if from_pack else data.index(b'\x00') + 1
+        return objects.parse_tree(data, start)
 
     def parse_pygit2(self) -> str | None:
         repo = self.pygit2_repos.get(self.git_dir)
         if repo is None:
             repo = plugins.pygit2.Repository(self.git_dir)
             repo.free()
-            self.pygit2_repos[self.git_dir] = repo
-
-        d: dict[str, int] = repo.status(untracked_files='normal')
+            self.pygit2_repos.put(self.git_dir, repo)
+
+        d: dict[str, int] = {}
+        if self.dirty_only:
+            # no way to stop pygit2 earlier
+            d = repo.status(untracked_files='no')
+        if not d:
+            d = repo.status(untracked_files='normal')
 
         unt = sta = mod = del_ = 0
         for value in d.values():
@@ -0,0 +1,202 @@
+"""
+Bounded caches for the gitstatus subpackage.
+"""
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+__all__ = ('LRUCache', 'trim_idle', 'report')
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+# every cache alive, for `trim_idle` and `report`
+_registry: 'weakref.WeakSet[LRUCache[Any, Any]]' = weakref.WeakSet()
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Least recently used cache bounded by number of entries and,
+    optionally, by bytes. The size of each value is given by the caller.
+    Values can be stored with a stamp (e.g. a mtime): a lookup with a
+    different stamp is a miss and drops the stale value.
+    It is safe to use from many threads.
+    """
+    __slots__ = (
+        'name',
+        'max_entries',
+        'max_bytes',
+        'max_idle',
+        'on_evict',
+        'bytes',
+        'hits',
+        'misses',
+        'evictions',
+        '_data',
+        '_lock',
+        '__weakref__',
+    )
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        max_bytes: int = 0,
+        max_idle: float = 0.0,
+        on_evict: Callable[[K, V], None] | None = None
+    ) -> None:
+        """
+        param `max_entries`: Entries kept. Zero disables the cache.
+        param `max_bytes`: Sum of sizes kept. Zero for no limit.
+        param `max_idle`: Seconds an entry is kept without being used,
+                          checked by `trim`. Zero for no limit.
+        param `on_evict`: Called with the key and the value of each entry
+                          the cache drops to stay in its budget.
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_idle = max_idle
+        self.on_evict = on_evict
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # {key: (stamp, value, size, last use)}
+        self._data: OrderedDict[K, tuple[Any, V, int, float]] = (
+            OrderedDict()
+        )
+        self._lock = threading.RLock()
+        _registry.add(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def get(self, key: K, stamp: Any = None) -> V | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            if item[0] != stamp:
+                self.misses += 1
+                self.pop(key)
+                return None
+
+            self.hits += 1
+            self._data[key] = item[0], item[1], item[2], time.monotonic()
+            self._data.move_to_end(key)
+            return item[1]
+
+    def put(
+        self, key: K, value: V, size: int = 0, stamp: Any = None
+    ) -> None:
+        with self._lock:
+            self.pop(key)
+
+            if self.max_entries <= 0:
+                return
+            if self.max_bytes and size > self.max_bytes:
+                return
+
+            self._data[key] = stamp, value, size, time.monotonic()
+            self.bytes += size
+            evicted = self._evict()
+
+        self._notify(evicted)
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+
+            self.bytes -= item[2]
+            return item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def items(self) -> list[tuple[K, V]]:
+        """
+        Gets the keys and values, least recently used first.
+        """
+        with self._lock:
+            return [(key, item[1]) for key, item in self._data.items()]
+
+    def trim(self, max_idle: float | None = None) -> int:
+        """
+        Drops the entries not used in the last `max_idle` seconds.
+        param `max_idle`: None for the one of the cache.
+        return: int: The number of entries dropped.
+        """
+        if max_idle is None:
+            max_idle = self.max_idle
+        if not max_idle:
+            return 0
+
+        limit = time.monotonic() - max_idle
+        evicted = []
+        with self._lock:
+            # the least recently used come first
+            while self._data:
+                key, item = next(iter(self._data.items()))
+                if item[3] > limit:
+                    break
+                del self._data[key]
+                self.bytes -= item[2]
+                evicted.append((key, item[1]))
+            self.evictions += len(evicted)
+
+        self._notify(evicted)
+        return len(evicted)
+
+    def _evict(self) -> list[tuple[K, V]]:
+        evicted = []
+        while len(self._data) > self.max_entries or (
+            self.max_bytes and self.bytes > self.max_bytes
+        ):
+            key, (_, value, size, _) = self._data.popitem(last=False)
+            self.bytes -= size
+            evicted.append((key, value))
+        self.evictions += len(evicted)
+
+        return evicted
+
+    def _notify(self, evicted: list[tuple[K, V]]) -> None:
+        # out of the lock, the callback may use other caches
+        if self.on_evict is not None:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def __repr__(self) -> str:
+        return (
+            f'{self.name}: {len(self._data)}/{self.max_entries} entries, '
+            f'{self.bytes}/{self.max_bytes or "-"} bytes, '
+            f'{self.hits} hits, {self.misses} misses, '
+            f'{self.evictions} evicted'
+        )
+
+
+def trim_idle() -> int:
+    """
+    Trims every cache by its `max_idle`.
+    return: int: The number of entries dropped.
+    """
+    return sum(i.trim() for i in list(_registry))
+
+
+def report() -> str:
+    """
+    return: str: The occupancy of every cache, one per line.
+    """
+    return '\n'.join(sorted(repr(i) for i in list(_registry)))
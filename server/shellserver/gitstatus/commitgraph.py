@@ -0,0 +1,193 @@
+"""
+Low level operations on the commit-graph files.
+https://git-scm.com/docs/gitformat-commit-graph
+"""
+
+import struct
+from mmap import mmap
+
+from .packs import ShaTable, FANOUT, SHA_SIZE, CHUNK
+
+__all__ = ('GraphLayer', 'CommitGraph', 'read_chain')
+
+HEADER = struct.Struct('>4sBBBB')
+MAGIC = b'CGPH'
+# tree, first parent, second parent and generation with commit time
+COMMIT_DATA = struct.Struct('>20sLLLL')
+EDGE = struct.Struct('>L')
+PARENT_NONE = 0x70000000
+# a second parent with the msb set indexes the extra edges list,
+# the last edge of a commit has it set too
+PARENT_EXTRA = 0x80000000
+
+
+class GraphLayer(ShaTable):
+    """
+    Reader of one commit-graph file over its mapping.
+    """
+    __slots__ = ('path', 'data_start', 'edges_start', 'bases')
+
+    def __init__(self, data: mmap | bytes, path: str) -> None:
+        magic, version, hash_version, chunks, bases = (
+            HEADER.unpack_from(data)
+        )
+        if magic != MAGIC or version != 1 or hash_version != 1:
+            raise ValueError('Unsupported commit-graph')
+
+        starts = {}
+        for i in range(chunks):
+            id_, start = CHUNK.unpack_from(
+                data, HEADER.size + i * CHUNK.size
+            )
+            starts[id_] = start
+        try:
+            fanout_start = starts[b'OIDF']
+            self.sha_start = starts[b'OIDL']
+            self.data_start = starts[b'CDAT']
+        except KeyError:
+            raise ValueError('Incomplete commit-graph') from None
+        self.edges_start = starts.get(b'EDGE')
+
+        self.data = data
+        self.fanout = FANOUT.unpack_from(data, fanout_start)
+        self.count = self.fanout[255]
+        self.path = path
+        self.bases = bases
+
+    def get_sha(self, pos: int) -> bytes:
+        start = self.sha_start + pos * SHA_SIZE
+        return self.data[start:start + SHA_SIZE]
+
+    def get_commit_data(self, pos: int) -> tuple[bytes, int, int, int, int]:
+        """
+        return: tuple: The tree, the two parent fields and the two
+                       words of generation and commit time.
+        """
+        return COMMIT_DATA.unpack_from(
+            self.data, self.data_start + pos * COMMIT_DATA.size
+        )
+
+    def get_extra_parents(self, edge: int) -> list[int]:
+        """
+        return: list: The parents from the second of an octopus merge.
+        """
+        if self.edges_start is None:
+            raise ValueError('Missing extra edges of commit-graph')
+
+        parents = []
+        while True:
+            (parent,) = EDGE.unpack_from(
+                self.data, self.edges_start + edge * EDGE.size
+            )
+            parents.append(parent & ~PARENT_EXTRA)
+            if parent & PARENT_EXTRA:
+                return parents
+            edge += 1
+
+
+class CommitGraph:
+    """
+    The commit-graph of a repository, a single file or a chain of
+    layers. Commits are addressed by their position in the whole graph,
+    the commits of the base layers first.
+    """
+    __slots__ = ('layers', 'top_down')
+
+    def __init__(self, layers: list[GraphLayer]) -> None:
+        """
+        param `layers`: From the base to the top of the chain.
+        """
+        for num, layer in enumerate(layers):
+            if layer.bases != num:
+                raise ValueError('Broken commit-graph chain')
+
+        self.layers = layers
+        # [(position of its first commit, layer)] from the top, where
+        # the recent commits are
+        self.top_down: list[tuple[int, GraphLayer]] = []
+        start = 0
+        for layer in layers:
+            self.top_down.insert(0, (start, layer))
+            start += layer.count
+
+    def __len__(self) -> int:
+        return sum(map(len, self.layers))
+
+    @property
+    def paths(self) -> list[str]:
+        return [i.path for i in self.layers]
+
+    def find(self, sha: bytes) -> int:
+        """
+        return: int: The position of the commit `sha`,
+                     -1 if it isn't there.
+        """
+        for start, layer in self.top_down:
+            pos = layer.find(sha)
+            if pos >= 0:
+                return start + pos
+
+        return -1
+
+    def _locate(self, pos: int) -> tuple[GraphLayer, int]:
+        for start, layer in self.top_down:
+            if pos >= start:
+                return layer, pos - start
+
+        raise IndexError(pos)
+
+    def get_sha(self, pos: int) -> bytes:
+        layer, local = self._locate(pos)
+        return layer.get_sha(local)
+
+    def get_tree(self, pos: int) -> bytes:
+        layer, local = self._locate(pos)
+        return layer.get_commit_data(local)[0]
+
+    def get_parents(self, pos: int) -> list[int]:
+        """
+        return: list: The positions of the parents, in order.
+        """
+        layer, local = self._locate(pos)
+        _, first, second, _, _ = layer.get_commit_data(local)
+
+        if first == PARENT_NONE:
+            return []
+        if second == PARENT_NONE:
+            return [first]
+        if second & PARENT_EXTRA:
+            return [first] + layer.get_extra_parents(second & ~PARENT_EXTRA)
+
+        return [first, second]
+
+    def get_generation(self, pos: int) -> int:
+        """
+        return: int: The topological level, 1 for root commits.
+        """
+        layer, local = self._locate(pos)
+        return layer.get_commit_data(local)[3] >> 2
+
+    def get_commit_time(self, pos: int) -> int:
+        layer, local = self._locate(pos)
+        _, _, _, high, low = layer.get_commit_data(local)
+        return (high & 3) << 32 | low
+
+    def get_tree_hash(self, cmmt_hash: str) -> str | None:
+        """
+        return: str | None: The tree of the commit, None if the commit
+                            isn't in the graph.
+        """
+        try:
+            pos = self.find(bytes.fromhex(cmmt_hash))
+        except ValueError:
+            return None
+
+        return None if pos < 0 else self.get_tree(pos).hex()
+
+
+def read_chain(content: str) -> list[str]:
+    """
+    return: list: The hashes of the layers in a commit-graph-chain,
+                  from the base.
+    """
+    return [i.strip() for i in content.splitlines() if i.strip()]
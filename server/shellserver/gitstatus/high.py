@@ -3,20 +3,29 @@ Module for functions with high level of abstraction
 and/or complexity.
 """
 
+import copy
 import ctypes
 from fnmatch import fnmatch
 import io
 import multiprocessing as mp
 import os
-import pickle
+import struct
+import threading as th
 import time
 
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from mmap import mmap
+from multiprocessing.queues import JoinableQueue
 from multiprocessing.shared_memory import SharedMemory
+from multiprocessing.synchronize import Semaphore
 from typing import Any
 
 from . import base
+from . import cache
+from . import index
+from . import objects
 from . import plugins
 from .utils import (
     PathMatchSpecW, DirEntryWrapper, DiscardOutput,
@@ -27,31 +36,99 @@ from .utils import (
 OS_CPU_COUNT = os.cpu_count() or 1
 n = '\n\n'
 
+# repositories whose packs, indexes and results are kept
+MAX_REPOS = 64
+# seconds a repository is kept without being visited
+REPO_IDLE = 30 * 60
+OBJECTS_CACHE_ENTRIES = 16 * 1024
+OBJECTS_CACHE_BYTES = 64 * 1024 * 1024
+# estimated bytes of a parsed tree entry, name included
+TREE_ENTRY_SIZE = 200
+# directories waiting for a thread, per thread, before the walker of
+# one goes down by itself
+PENDING_PER_THREAD = 2
+
+# multiproc messages hold only paths, stamps and counters,
+# never what grows with the repo
+SHM_SIZE = 256 * 1024
+LENGTH = struct.Struct('<L')
+INTEGER = struct.Struct('<q')
+# flag, untracked, staged, modified and deleted of a worker
+RESULT = struct.Struct('<cqqqq')
+# never in paths nor in patterns
+TASK_SEP = '\x00'
+
 
 class FallbackError(Exception):
-    pass
+    """
+    The status can't be got without git. The message is the reason.
+    """
+
+
+class CancelledError(Exception):
+    """
+    The walk was stopped by `High.cancel` or its deadline.
+    """
+
+    def __init__(self, partial: str | None = None) -> None:
+        super().__init__(partial)
+        # the status of what was compared before the stop
+        self.partial = partial
 
 
 class MemFlag:
     EMPTY = b'\x00'
-    INIT = b'\xf1'
     STATUS = b'\xf2'
-    TURN = b'\xf3'
     COLLECT = b'\xf4'
     WORKER_RES = b'\xf5'
     QUIT = b'\xf6'
     ERROR = b'\xf7'
 
 
-def _workers_entry_point() -> None:
-    obj = High(_is_worker=True)
+def _workers_entry_point(
+    proc_num: int,
+    workers: int,
+    wake: Any,
+    results: Any,
+    tasks: Any,
+    cancelled: Any
+) -> None:
+    # main already fell back for big indexes
+    obj = High(workers=workers, fallback=False, _is_worker=True)
+    obj.proc_num = proc_num
+    obj.wake = wake
+    obj.results = results
+    obj.tasks = tasks
+    obj.cancelled = cancelled
     obj.worker_mainloop()
 
 
+def encode_task(relpath: str, fixed: list[str], relative: list[str]) -> bytes:
+    """
+    return: bytes: A directory to walk and the ignore patterns of its
+                   parents, for the queue of the workers.
+    """
+    fields = [relpath, str(len(fixed)), *fixed, *relative]
+    return TASK_SEP.join(fields).encode()
+
+
+def decode_task(data: bytes) -> tuple[str, list[str], list[str]]:
+    """
+    return: tuple: The relpath, the fixed and the relative patterns.
+    """
+    relpath, count, *patterns = data.decode().split(TASK_SEP)
+    fixed_count = int(count)
+    return relpath, patterns[:fixed_count], patterns[fixed_count:]
+
+
 class High(base.Base):
 
     # dropped __slots__
 
+    # workers only, set by `_workers_entry_point`
+    proc_num: int
+    wake: Semaphore
+
     def __init__(
             self,
             *,
@@ -61,6 +138,10 @@ class High(base.Base):
             read_async: bool = True,
             fallback: bool = True,
             watchdog: bool = True,
+            dirty_only: bool = False,
+            threaded: bool = False,
+            index_cache_entries: int = 16,
+            index_cache_bytes: int = 64 * 1024 * 1024,
             output: io.TextIOWrapper | DiscardOutput | None = None,
             _is_worker: bool = False,
             **kwargs,
@@ -71,6 +152,18 @@ class High(base.Base):
         self.read_async = read_async
         self.fallback = fallback
         self.watchdog = watchdog
+        self.dirty_only = dirty_only
+        self.threaded = threaded
+        self.threads = workers or OS_CPU_COUNT
+        self.pool: ThreadPoolExecutor | None = None
+        # the walk the threads share, only set on their walkers
+        self.walk: ThreadedWalk | None = None
+        # the walk of the threads while main waits for it
+        self.running_walk: ThreadedWalk | None = None
+        # checked before each directory, shared with the walkers
+        self.cancelled: Any = th.Event()
+        # `time.monotonic_ns` after which the walk is cancelled, 0 never
+        self.deadline = 0
 
         self.output: io.TextIOWrapper | io.StringIO | DiscardOutput
         if not isinstance(
@@ -85,13 +178,35 @@ class High(base.Base):
         self.modified = 0
         self.deleted = 0
         self.use_cr = True
-        # {hash : tree_items_list}
-        self.objects_cache: dict[str, list[tuple[str, str, str]]] = {}
+        # {hash : tree}
+        self.objects_cache: cache.LRUCache[str, objects.Tree] = (
+            cache.LRUCache(
+                'tree objects', OBJECTS_CACHE_ENTRIES, OBJECTS_CACHE_BYTES
+            )
+        )
 
-        self.event_handlers: dict[str, EventHandler] = {}
-        self.final_result_cache: dict[
-            str, tuple[float | None, str | None]] = {}
-        self.dirs_mtimes: dict[str, float] = {}
+        # {git_dir: None} visited repositories, what is kept of them
+        # is dropped with them
+        self.repos: cache.LRUCache[str, None] = cache.LRUCache(
+            'repos', MAX_REPOS, max_idle=REPO_IDLE,
+            on_evict=lambda git_dir, _: self.forget_repo(git_dir)
+        )
+        self.event_handlers: cache.LRUCache[str, EventHandler] = (
+            cache.LRUCache(
+                'watched repos', MAX_REPOS, on_evict=self.unwatch
+            )
+        )
+        self.final_result_cache: cache.LRUCache[
+            str, tuple[float | None, str | None]
+        ] = cache.LRUCache('results', MAX_REPOS)
+        self.dirs_mtimes: cache.LRUCache[str, float] = cache.LRUCache(
+            'dirs mtimes', MAX_REPOS
+        )
+        # {relpath: untracked names} trusted entries of the untracked cache
+        self.untracked_memo: dict[str, frozenset[str] | None] = {}
+        self.index_cache = cache.LRUCache(
+            'index', index_cache_entries, index_cache_bytes
+        )
 
         self.files_readden: deque[
             tuple[ctypes.Array[Any], OVERLAPPED, float, str]
@@ -105,27 +220,38 @@ class High(base.Base):
             return
 
         self.workers = workers
-        self.switch = 0
-        self.orders_sent = 0
+        # workers wait for directories after a status message
+        self.walking = False
 
         self.shm = SharedMemory(
             name='shellserver_shared_memory',
             create=multiproc,
-            size=1024 * 1024 * 2
+            size=SHM_SIZE
         )
 
         assert isinstance(self.shm.buf.obj, mmap)
         self.mmap = self.shm.buf.obj
 
         if multiproc:
-            for _ in range(workers):
+            # workers stop their directories too
+            self.cancelled = mp.Event()
+            # blocking handoff: a worker waits on its semaphore, released
+            # once per message, and main on one released per result
+            self.wakes = [mp.Semaphore(0) for _ in range(workers)]
+            self.results = mp.Semaphore(0)
+            # `encode_task` of directories published by any walker,
+            # main included, and taken by any idle worker
+            self.tasks: JoinableQueue[bytes | None] = mp.JoinableQueue()
+            for num, wake in enumerate(self.wakes, 1):
                 mp.Process(
-                    target=_workers_entry_point, daemon=True
+                    target=_workers_entry_point,
+                    args=(
+                        num, workers, wake, self.results, self.tasks,
+                        self.cancelled
+                    ),
+                    daemon=True
                 ).start()
 
-        if not self.mp_main:
-            self.proc_num = int(mp.current_process().name[-1])
-
     def init(self, git_dir: str, branch: str) -> None:
         self.git_dir = git_dir
         self.branch = branch
@@ -133,8 +259,7 @@ class High(base.Base):
         if self.multiproc and not self.mp_main:
             return
 
-        if self.multiproc:
-            self.write_shm(self.git_dir, branch, flag=MemFlag.INIT)
+        self.repos.put(git_dir, None)
 
         if plugins.HAS_WATCHDOG and self.watchdog:
             handler = self.event_handlers.get(self.git_dir)
@@ -142,16 +267,32 @@ class High(base.Base):
                 return
 
             handler = EventHandler(self)
-            self.event_handlers[self.git_dir] = handler
-
-            plugins.observer.schedule(
+            handler.watch = plugins.observer.schedule(
                 handler, self.git_dir, recursive=True
             )
+            self.event_handlers.put(self.git_dir, handler)
+
+    def unwatch(self, git_dir: str, handler: 'EventHandler') -> None:
+        """
+        Stops watching `git_dir`. Its results can't be trusted anymore.
+        """
+        plugins.observer.unschedule(handler.watch)
+        self.final_result_cache.pop(git_dir)
+        self.dirs_mtimes.pop(git_dir)
+
+    def forget_repo(self, git_dir: str) -> None:
+        super().forget_repo(git_dir)
+
+        handler = self.event_handlers.pop(git_dir)
+        if handler is not None:
+            self.unwatch(git_dir, handler)
 
-    def status(self) -> str | None:
+    def status(self, fallback: bool | None = None) -> str | None:
         """
         Only MainProcess will call this.
         Do a inline version of 'git status' without any use of git.
+        param `fallback`: Raise FallbackError for big indexes,
+                          `self.fallback` if None.
         return: str | None: String with the status, None if there's
                             nothing to report.
         """
@@ -160,14 +301,21 @@ class High(base.Base):
         self.output.write(f'Branch {self.branch}{n}')
 
         try:
-            self.set_index_tracked()
+            self.set_index_tracked(fallback)
         except base.IndexTooBigError:
             self.output.write('Index too big, Fallback.\n')
             if self.multiproc and self.mp_main:
                 self.main_collect()
-            raise FallbackError
+            raise FallbackError('index too big')
+        except base.UnsupportedIndexError:
+            self.output.write('Unsupported index, Fallback.\n')
+            if self.multiproc and self.mp_main:
+                self.main_collect()
+            raise FallbackError('unsupported index')
 
         self.output.write(f'Index len: {len(self.index_tracked)}\n')
+        self.untracked_memo.clear()
+        cancelled = False
 
         exclude_content = self.get_exclude_content()
 
@@ -177,16 +325,37 @@ class High(base.Base):
             self.output.write(pat + '\n')
         self.output.write('\n')
 
+        # the index isn't sent: workers read it, once per version
         if self.multiproc:
             self.write_shm(
-                self.index_tracked, self.packs_list, flag=MemFlag.STATUS
+                self.git_dir, self.index_mtime_ns, self.deadline,
+                flag=MemFlag.STATUS
             )
+            self.walking = True
 
         last_cmmt = self.get_last_commit_hash()
+        self.set_staged(last_cmmt)
 
-        self.set_full_status(
-            self.git_dir, last_cmmt, exclude_content=exclude_content
-        )
+        # left by `threaded` turned off under a running status
+        if not self.threaded:
+            self.close_pool()
+
+        try:
+            if self.is_dirty():
+                self.output.write('Dirty, the worktree is not walked.\n')
+            # a single walker stops at the first change
+            elif (
+                self.threaded and not self.multiproc and not self.dirty_only
+            ):
+                self.set_full_status_threaded(exclude_content)
+            else:
+                self.set_full_status(
+                    self.git_dir, exclude_content=exclude_content
+                )
+        # the reads and the workers are still waited for
+        except CancelledError:
+            self.output.write('Cancelled.\n')
+            cancelled = True
 
         if not self.linear and self.read_async:
             self.handle_files_readden_async()
@@ -194,11 +363,14 @@ class High(base.Base):
 
         if self.multiproc:
             err = self.main_collect()
-            if err:
-                raise FallbackError
+            # by a worker past the deadline, what it counts as an error
+            cancelled = cancelled or self.cancelled.is_set()
+        else:
+            err = 0
 
         status_string = self.get_status_string(
-            (self.untracked, self.staged, self.modified, self.deleted)
+            (self.untracked, self.staged, self.modified, self.deleted),
+            partial=cancelled
         )
 
         self.untracked = 0
@@ -206,44 +378,275 @@ class High(base.Base):
         self.modified = 0
         self.deleted = 0
 
+        # after the reset, or the next status would count from them
+        if cancelled:
+            raise CancelledError(status_string)
+        if err:
+            raise FallbackError('error in a worker')
+
         if not self.multiproc:
             self.output.write(
                 'Entries classified: '
                 f'{DirEntryWrapper.counter}\n'
             )
         DirEntryWrapper.counter = 0
+        self.output.write(f'Caches:\n{cache.report()}{n}')
 
         return status_string
 
+    def get_partial_status(self) -> str | None:
+        """
+        Called from other thread while `status` runs.
+        return: str | None: The status of what was compared so far, with
+                            the counts of the threads but not those of
+                            the workers. None if nothing was found yet.
+        """
+        walk = self.running_walk
+        if walk is None:
+            counts = [
+                self.untracked, self.staged, self.modified, self.deleted
+            ]
+        # not while `join` moves the counts of the walkers here
+        else:
+            with walk.lock:
+                counts = [
+                    self.untracked, self.staged, self.modified, self.deleted
+                ]
+                if self.running_walk is walk:
+                    for walker in list(walk.walkers.values()):
+                        counts[0] += walker.untracked
+                        counts[1] += walker.staged
+                        counts[2] += walker.modified
+                        counts[3] += walker.deleted
+
+        return self.get_status_string(
+            (counts[0], counts[1], counts[2], counts[3]), partial=True
+        )
+
+    def cancel(self) -> None:
+        """
+        Called from other thread. The running status raises
+        CancelledError before its next directory.
+        """
+        self.cancelled.set()
+
+    def set_deadline(self, timeout: float | None) -> None:
+        """
+        Undoes `cancel`, for the next status.
+        param `timeout`: Seconds from now after which the walk is
+                         cancelled, None for no limit.
+        """
+        self.cancelled.clear()
+        if timeout is None:
+            self.deadline = 0
+        else:
+            self.deadline = time.monotonic_ns() + int(timeout * 1e9)
+
+    def is_cancelled(self) -> bool:
+        if self.deadline and time.monotonic_ns() > self.deadline:
+            # seen at once by the walkers and the workers
+            self.cancelled.set()
+
+        return self.cancelled.is_set()
+
+    def is_dirty(self) -> bool:
+        """
+        return: bool: If the search can stop, with dirty_only and some
+                      change already found.
+        """
+        return self.dirty_only and bool(
+            self.untracked or self.staged or self.modified or self.deleted
+        )
+
+    def set_staged(self, last_cmmt: str | None) -> None:
+        """
+        Counts the differences between the index and the last commit.
+        Only the index and the trees are read, never the worktree.
+        param `last_cmmt`: The hash of the last commit.
+        """
+        if last_cmmt is None:
+            self.output.write('No commit, every entry is staged.\n')
+            self.staged += self.git_index.count('')
+            return
+
+        tree_hash = self.get_commit_tree_hash(last_cmmt)
+        if tree_hash is not None:
+            self.set_staged_tree(tree_hash, '')
+
+    def set_staged_tree(self, tree_hash: str, relpath: str) -> None:
+        """
+        param `tree_hash`: The tree of the last commit for `relpath`.
+        param `relpath`: The directory in the index, '' for the root.
+        """
+        cached = self.git_index.cache_tree.get(relpath)
+        if cached is not None and cached[0] == tree_hash:
+            self.output.write(f'Same tree in cache-tree: "{relpath}"\n')
+            return
+
+        tree = self.get_tree(tree_hash)
+        if tree is None:
+            return
+
+        prefix = relpath + '/' if relpath else ''
+        files = self.git_index.get_files(relpath)
+        in_tree = set()
+
+        for name, sha in tree.trees.items():
+            if self.is_dirty():
+                return
+
+            entry = files.get(name)
+            if entry is not None and entry.mode == index.MODE_SPARSE_DIR:
+                in_tree.add(name)
+                self.staged += self.count_trees_diff(
+                    entry.sha.hex(), sha.hex()
+                )
+            elif self.git_index.has_dir(prefix + name):
+                self.set_staged_tree(sha.hex(), prefix + name)
+            else:
+                self.output.write(f'Staged: {prefix}{name}/ removed\n')
+                # there's a file at least, no need to count them
+                self.staged += 1 if self.dirty_only else (
+                    self.count_tree_files(sha.hex())
+                )
+
+        if self.is_dirty():
+            return
+
+        for name in chain(tree.blobs, tree.links):
+            entry = files.get(name)
+            if entry is None:
+                self.output.write(f'Staged: {prefix}{name} removed\n')
+                self.staged += 1
+                continue
+
+            in_tree.add(name)
+            if (entry.mode, entry.sha) != tree.get_file(name):
+                self.output.write(f'Staged: {prefix}{name}\n')
+                self.staged += 1
+
+        # in the index but not under the commit
+        added = len(files) - len(in_tree)
+        if added and (self.git_index.intent_to_add or self.git_index.sparse):
+            added = 0
+            for name, entry in files.items():
+                if name in in_tree or entry.flags & index.FLAG_INTENT_TO_ADD:
+                    continue
+                if entry.mode == index.MODE_SPARSE_DIR:
+                    added += self.count_tree_files(entry.sha.hex())
+                else:
+                    added += 1
+
+        if added:
+            self.output.write(f'Staged: {added} new files in "{relpath}"\n')
+            self.staged += added
+
+        for name in self.git_index.get_subdirs(relpath).difference(
+            tree.trees
+        ):
+            self.output.write(f'Staged: {prefix}{name}/ added\n')
+            self.staged += self.git_index.count(prefix + name)
+
+    def count_tree_files(self, tree_hash: str) -> int:
+        tree = self.get_tree(tree_hash)
+        if tree is None:
+            return 0
+
+        return len(tree.blobs) + len(tree.links) + sum(
+            self.count_tree_files(sha.hex()) for sha in tree.trees.values()
+        )
+
+    def count_trees_diff(self, tree_hash: str, other_hash: str) -> int:
+        """
+        Counts the files that differ between two trees, as for a
+        sparse directory of the index that isn't the one committed.
+        """
+        if tree_hash == other_hash:
+            return 0
+
+        tree = self.get_tree(tree_hash)
+        other = self.get_tree(other_hash)
+        if tree is None or other is None:
+            return 0
+
+        res = 0
+        for name, sha in tree.trees.items():
+            other_sha = other.trees.get(name)
+            if other_sha is None:
+                res += self.count_tree_files(sha.hex())
+            else:
+                res += self.count_trees_diff(sha.hex(), other_sha.hex())
+
+        for name, sha in other.trees.items():
+            if name not in tree.trees:
+                res += self.count_tree_files(sha.hex())
+
+        # also the files that became a tree, or the other way
+        names = set(chain(tree.blobs, tree.links, other.blobs, other.links))
+        for name in names:
+            if tree.get_file(name) != other.get_file(name):
+                res += 1
+
+        return res
+
+    def set_full_status_threaded(
+        self, exclude_content: list[str] | None
+    ) -> None:
+        """
+        Compares the worktree with the index, the directories walked by
+        the threads of the pool.
+        """
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(
+                self.threads, thread_name_prefix='gitstatus'
+            )
+
+        walk = ThreadedWalk(self, self.pool)
+        self.running_walk = walk
+        walk.submit(
+            self.git_dir, None, None, None, exclude_content=exclude_content
+        )
+        walk.join()
+        self.output.write(
+            f'Threads: {len(walk.walkers)}, directories: {walk.submitted}\n'
+        )
+
+    def close_pool(self) -> None:
+        """
+        Lets the threads of the pool end. A threaded status starts
+        another one.
+        """
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
     def load_balancer(
         self,
         dir_path: str,
-        tree_hash: str,
         relpath: str,
         fixed_prev: list[str],
         relative_prev: list[str]
     ) -> None:
 
-        if self.multiproc and self.mp_main:
-            self.switch += 1
+        if self.walk is not None and self.walk.can_submit():
+            self.walk.submit(dir_path, relpath, fixed_prev, relative_prev)
+            return
 
-            if self.switch <= self.workers:
-                self.write_shm(
-                    self.switch, dir_path, tree_hash,
-                    relpath, fixed_prev, relative_prev,
-                    flag=MemFlag.TURN
-                )
-                self.orders_sent += 1
-                return
+        # a single walker stops at the first change.
+        # Below one directory waiting per worker, the idle ones would
+        # have nothing to take
+        if (
+            self.multiproc and not self.dirty_only
+            and self.tasks.qsize() < self.workers
+        ):
+            self.tasks.put(encode_task(relpath, fixed_prev, relative_prev))
+            return
 
-        self.set_full_status(
-            dir_path, tree_hash, relpath, fixed_prev, relative_prev
-        )
+        self.set_full_status(dir_path, relpath, fixed_prev, relative_prev)
 
     def set_full_status(
         self,
         dir_path: str,
-        tree_hash: str | None,
         relpath: str | None = None,
         fixed_prev: list[str] | None = None,
         relative_prev: list[str] | None = None,
@@ -251,70 +654,75 @@ class High(base.Base):
         exclude_content: list[str] | None = None,
     ) -> None:
         """
+        Compares the worktree with the index.
         param `dir_path`: Initial path from which scan begins.
                 Will be used recursively
-        param `tree_hash`: For recursive use only.
+        param `relpath`: For recursive use only.
         """
-
-        first_call = exclude_content is not None
+        if self.is_cancelled():
+            raise CancelledError
 
         fixed, relative, clean_fixed = self.get_ignored_lists(
             dir_path, relpath, fixed_prev, relative_prev, exclude_content
         )
 
-        if '*' in relative:
-            return
-
-        # [(file_type, hash, filename)]
-        tree_items_list: list[tuple[str, str, str]] | None = []
-
-        if first_call and tree_hash is not None:
-            tree_items_list = self.get_tree_items(tree_hash, True)
-        elif tree_hash:
-            tree_items_list = self.get_tree_items(tree_hash)
+        # {filename: entry}
+        files = self.git_index.get_files(relpath or '')
+        # summed once the directory is walked, a partial sum would be
+        # taken by `is_dirty` as deleted files
+        deleted = len(files)
+        if self.git_index.skip_worktree:
+            deleted -= self.git_index.count_skip_worktree(relpath or '')
 
-        if tree_items_list is None:
-            return
-
-        self.deleted += len(tree_items_list)
-
-        # {filename: hash}
-        tracked_directories = {
-            i[2]: i[1]
-            for i in tree_items_list
-            if i[0] == '40000'
-        }
+        cached_untracked = self.get_cached_untracked(
+            dir_path, relpath or ''
+        )
 
         try:
             directory = os.scandir(dir_path)
 
         # NotADir: if symlink (a file) points to a dir
         except (PermissionError, NotADirectoryError):
+            self.deleted += deleted
             return
 
         for dir_entry in directory:
 
-            if self.raised_exception:
+            if self.raised_exception or self.is_dirty():
                 break
 
             file = DirEntryWrapper(dir_entry, self.git_dir)
 
             # 100755(exe) is file
             if file.is_file():
-                if file.relpath in self.index_tracked:
-                    self.handle_tracked_file(
-                        file, tree_items_list, file.relpath
-                    )
+                entry = files.get(file.name)
+                if entry is not None:
+                    if entry.flags & index.FLAG_SKIP_WORKTREE:
+                        pass
+                    elif entry.flags & index.FLAG_INTENT_TO_ADD:
+                        self.output.write(f'Intent to add: {file.relpath}\n')
+                        deleted -= 1
+                        self.modified += 1
+                    else:
+                        deleted -= 1
+                        self.handle_tracked_file(file, entry)
+
+                elif cached_untracked is not None:
+                    if file.name in cached_untracked:
+                        self.output.write(f'Untracked: {file.relpath}\n')
+                        self.untracked += 1
 
                 elif not self.is_ignored(file, fixed, relative):
                     self.output.write(f'Untracked: {file.relpath}\n')
                     self.untracked += 1
 
-            if file.is_dir() and file.name != '.git':
-                self.handle_dir(
-                    file, fixed, relative, clean_fixed,
-                    tracked_directories, tree_items_list
-                )
+            if file.is_dir() and file.name != '.git' and self.handle_dir(
+                file, fixed, relative, clean_fixed,
+                files, cached_untracked
+            ):
+                deleted -= 1
+
+        self.deleted += deleted
 
     def handle_dir(
         self,
@@ -322,89 +730,92 @@ class High(base.Base):
         fixed: list[str],
         relative: list[str],
         clean_fixed: list[str],
-        tracked_directories: dict[str, str],
-        tree_items_list: list[tuple[str, str, str]]
-    ) -> None:
-
-        if file.name in tracked_directories:
-            self.deleted -= 1
-            tree_hash = tracked_directories[file.name]
+        files: dict[str, index.IndexEntry],
+        cached_untracked: frozenset[str] | None = None
+    ) -> bool:
+        """
+        return: bool: If the directory is an entry of `files`, a submodule
+                      or a symlink.
+        """
 
+        if self.git_index.has_dir(file.relpath):
             self.load_balancer(
                 file.path,
-                tree_hash,
                 file.relpath,
                 fixed_prev=clean_fixed,
                 relative_prev=relative
             )
 
-        elif self.is_ignored(file, fixed, relative):
+        # sparse directory or other skip-worktree entry
+        elif (
+            file.name in files
+            and files[file.name].flags & index.FLAG_SKIP_WORKTREE
+        ):
             pass
 
-        # check if dir is a submodule
-        elif file.name in (
-                i[2] for i in
-                filter(lambda x: x[0] == '160000', tree_items_list)
+        # submodule or symlink to a directory
+        elif file.name in files and files[file.name].mode in (
+            0o160000, 0o120000
         ):
-            self.deleted -= 1
+            return True
 
-        else:
-            _, file_present = self.handle_untracked_dir(
-                file.path, file.relpath, clean_fixed, relative
-            )
+        elif (
+            cached_untracked is not None
+            and file.name + '/' in cached_untracked
+        ):
+            self.output.write(f'Untracked: {file.relpath}\n')
+            self.untracked += 1
 
-            if file_present:
-                self.output.write(f'Untracked: {file.relpath}\n')
-                self.untracked += 1
+        # ignored or empty to git
+        elif cached_untracked is not None:
+            pass
 
-    def handle_tracked_file(
-        self,
-        file: DirEntryWrapper,
-        tree_items_list: list[tuple[str, str, str]],
-        relpath: str
-    ) -> None:
-        # get the item or it's staged
-        for item in tree_items_list:
-            if item[2] == file.name:
-                break
-        else:
-            self.output.write(
-                f"Staged: {relpath} isn't under a commit.\n"
-            )
-            self.staged += 1
-            return
+        elif self.is_ignored(file, fixed, relative):
+            pass
 
-        self.deleted -= 1
+        elif self.handle_untracked_dir(
+            file.path, file.relpath, clean_fixed, relative
+        ):
+            self.output.write(f'Untracked: {file.relpath}\n')
+            self.untracked += 1
 
-        mtime = self.index_tracked[relpath]
+        return False
+
+    def handle_tracked_file(
+        self, file: DirEntryWrapper, entry: index.IndexEntry
+    ) -> None:
         st = file.stat()
-        st_mtime, st_size = st.st_mtime, st.st_size
-        if st_mtime != mtime:
-            self.output.write(f'Modified: {relpath}\n')
-            self.modified += 1
+        st_size = st.st_size
+        file_hash_in_index = entry.sha.hex()
+
+        # content is the one in index, no need to read the file
+        if (
+            index.stat_matches(entry, st)
+            and not index.is_racy(entry, self.index_mtime_ns)
+        ):
             return
 
-        file_hash_in_tree = item[1]
-        if not self.linear and self.read_async:
+        # with dirty_only a change stops the search as soon as it's read
+        if not self.linear and self.read_async and not self.dirty_only:
             buffer, overl = read_async(file.path, st_size)
             self.files_readden.append(
-                (buffer, overl, st_size, file_hash_in_tree)
+                (buffer, overl, st_size, file_hash_in_index)
             )
             return
 
         # use_cr: interchangeably switch the use of crlf
         file_hash = self.get_hash_of_file(file.path, self.use_cr)
 
-        if file_hash_in_tree == file_hash:
+        if file_hash_in_index == file_hash:
             return
 
-        elif file_hash_in_tree == self.get_hash_of_file(
+        elif file_hash_in_index == self.get_hash_of_file(
             file.path, not self.use_cr, True
         ):
             self.use_cr = not self.use_cr
             return
 
-        self.output.write(f'Modified: {relpath}\n')
+        self.output.write(f'Modified: {file.relpath}\n')
         self.modified += 1
         return
 
@@ -414,118 +825,138 @@ class High(base.Base):
         relpath: str,
         fixed_prev: list[str],
         relative_prev: list[str]
-    ) -> tuple[int, bool]:
+    ) -> bool:
         """
-        Handles when `set_full_status` finds untracked directory.
+        Handles when `set_full_status` finds a directory without entries
+        in the index.
         param `dir_path`: The path of the untracked directory.
+        return: bool: If there is a file not ignored under it.
         """
         fixed, relative, clean_fixed = self.get_ignored_lists(
             dir_path, relpath, fixed_prev, relative_prev
         )
 
         if '*' in relative:
-            return 0, False
+            return False
 
         try:
             directory = os.scandir(dir_path)
         except (PermissionError, NotADirectoryError):
-            return 0, False
+            return False
 
         sub_dir = []
         for file in directory:
             if file.name == '.git':
                 directory.close()
-                return 0, False
+                return False
             sub_dir.append(DirEntryWrapper(file, self.git_dir))
 
-        file_present = False
-        staged_flag = 0
-        marked_dirs_to_classify: list[DirEntryWrapper] = []
         for sub_file in sub_dir:
-
-            if sub_file.relpath in self.index_tracked:
-                self.output.write(f'Staged: {sub_file.relpath}\n')
-                self.staged += 1
-                staged_flag += 1
-                file_present = True
-
-            elif self.is_ignored(
-                sub_file, fixed, relative
-            ):
+            if self.is_ignored(sub_file, fixed, relative):
                 continue
 
-            elif sub_file.is_dir():
-                ret = self.handle_untracked_dir(
-                    sub_file.path, sub_file.relpath, clean_fixed, relative
-                )
+            if not sub_file.is_dir() or self.handle_untracked_dir(
+                sub_file.path, sub_file.relpath, clean_fixed, relative
+            ):
+                return True
 
-                staged_flag += ret[0]
-                child_file_present = ret[1]
+        return False
 
-                if child_file_present:
-                    file_present = True
-                    marked_dirs_to_classify.append(sub_file)
-            else:
-                file_present = True
-
-        if staged_flag:  # reiterate searching for untracked
-            for sub_file in sub_dir:
-                if (
-                    sub_file.is_file()
-                    and sub_file.relpath not in self.index_tracked
-                    and not self.is_ignored(
-                        sub_file, fixed, relative
-                    )
-                ):
-                    self.output.write(f'Untracked: {sub_file.relpath}\n')
-                    self.untracked += 1
+    def get_cached_untracked(
+        self, dir_path: str, relpath: str
+    ) -> frozenset[str] | None:
+        """
+        Gets the untracked names that git recorded for a directory in the
+        untracked cache. The directory and its parents must keep the
+        stat data and the .gitignore recorded.
+        return: frozenset | None: The names, directories ending in '/',
+                                  None if the cache can't be trusted.
+        """
+        uc = self.git_index.untracked_cache
+        if uc is None:
+            return None
 
-            for sub_file in marked_dirs_to_classify:
-                self.output.write(f'Untracked: {sub_file.relpath}\n')
-                self.untracked += 1
+        if relpath in self.untracked_memo:
+            return self.untracked_memo[relpath]
 
-            file_present = False
+        if relpath:
+            parent_trusted = self.get_cached_untracked(
+                os.path.dirname(dir_path), relpath.rpartition('/')[0]
+            ) is not None
+        else:
+            parent_trusted = self.check_untracked_cache(uc)
+
+        res = None
+        cached = uc.dirs.get(relpath)
+        if parent_trusted and cached is not None:
+            stat_data, names, gitignore_hash = cached
+
+            local_hash: str | None = None
+            try:
+                st = os.stat(dir_path)
+                local_hash = self.get_gitignore_hash(dir_path)
+            except OSError:
+                st = None
+
+            if (
+                st is not None
+                and index.stat_matches(stat_data, st)
+                and not index.is_racy(stat_data, self.index_mtime_ns)
+                and local_hash == gitignore_hash
+            ):
+                res = names
 
-        return staged_flag, file_present
+        self.output.write(f'Untracked cache for "{relpath}": {res}\n')
+        self.untracked_memo[relpath] = res
+        return res
 
-    def get_tree_items(
-        self, hash_: str, is_cmmt: bool = False
-    ) -> list[tuple[str, str, str]] | None:
+    def get_commit_tree_hash(self, cmmt_hash: str) -> str | None:
         """
-        Gets the last commit tree itens (type, hash and filename).
-        param `last_cmmt`: The hash of the last commit.
-        return: list: list of tuples with the type, hash and filenames,
-                      empty list if git tree is empty
+        Gets the hash of the tree of a commit, from the commit-graph
+        if it has the commit, else from the commit object.
+        return: str | None: The tree hash, None if the commit wasn't found
+                            by a worker.
         """
+        graph = self.get_commit_graph()
+        if graph is not None:
+            tree_hash = graph.get_tree_hash(cmmt_hash)
+            if tree_hash is not None:
+                self.output.write(
+                    f'Last commit tree hash from commit-graph: {tree_hash}\n'
+                )
+                return tree_hash
 
-        tree_items_list = self.objects_cache.get(hash_)
+        # the tree is on the first line, after the header
+        cmmt_obj = self.get_content_by_hash_loose(
+            cmmt_hash, objects.LOOSE_HEADER_MAX + len('tree \n') + 40
+        )
+        if cmmt_obj is None:
+            cmmt_obj = self.get_content_by_hash_packed(cmmt_hash)
 
-        if tree_items_list is not None:
-            self.output.write(f'Gotten cached object for hash {hash_}\n')
-            for i in tree_items_list:
-                self.output.write(f'{i}\n')
-            self.output.write(n)
-            return tree_items_list
+        if cmmt_obj is None:
+            self.output.write("Couldn't get last commit object. Fallback.\n")
+            if not self.multiproc:
+                raise FallbackError('commit object not found')
+            else:
+                self.raised_exception = True
+                return None
 
-        if is_cmmt:
-            last_cmmt_obj = self.get_content_by_hash_loose(hash_)
-            if last_cmmt_obj is None:
-                last_cmmt_obj = self.get_content_by_hash_packed(hash_)
+        tree_hash = self.get_tree_hash_from_commit(cmmt_obj)
+        self.output.write(f'Last commit tree hash: {tree_hash}\n')
+        return tree_hash
 
-            if last_cmmt_obj is None:
-                self.output.write(
-                    "Couldn't get last commit object. Fallback.\n"
-                )
-                if not self.multiproc:
-                    raise FallbackError
-                else:
-                    self.raised_exception = True
-                    return None
+    def get_tree(self, tree_hash: str) -> objects.Tree | None:
+        """
+        Gets a tree object parsed.
+        param `tree_hash`: The hash of the tree.
+        return: Tree | None: Its entries, None if a worker didn't find it.
+        """
 
-            tree_hash = self.get_tree_hash_from_commit(last_cmmt_obj)
-            self.output.write(f'Last commit tree hash: {tree_hash}\n')
-        else:
-            tree_hash = hash_
+        tree = self.objects_cache.get(tree_hash)
+
+        if tree is not None:
+            self.output.write(f'Gotten cached tree {tree_hash}: {tree}\n')
+            return tree
 
         from_pack = False
         tree_obj = self.get_content_by_hash_loose(tree_hash)
@@ -545,24 +976,17 @@ class High(base.Base):
             self.deleted = 0
 
             if not self.multiproc:
-                raise FallbackError
+                raise FallbackError(f'tree object {tree_hash} not found')
             else:
                 self.raised_exception = True
                 return None
 
-        tree_items_list = []
-
-        # there is a tree object but the git worktree is empty.
-        if tree_obj:
-            tree_items_list = self.parse_tree_object(tree_obj, from_pack)
-            self.output.write('Found:\n')
-            for i in tree_items_list:
-                self.output.write(f'{i}\n')
-            self.output.write(n)
+        tree = self.parse_tree_object(tree_obj, from_pack)
+        self.output.write(f'Found tree {tree_hash}: {tree}\n')
 
-        self.objects_cache[tree_hash] = tree_items_list
+        self.objects_cache.put(tree_hash, tree, TREE_ENTRY_SIZE * len(tree))
 
-        return tree_items_list
+        return tree
 
     def is_ignored(
         self,
@@ -607,20 +1031,22 @@ class High(base.Base):
         return False
 
     def get_cached_result(self) -> int | str | None:
-        cache = self.final_result_cache.get(self.git_dir)
+        cached = self.final_result_cache.get(self.git_dir)
         mtime = self.dirs_mtimes.get(self.git_dir)
 
-        if cache and mtime == cache[0]:
-            result: str | None = cache[1]
+        if cached and mtime == cached[0]:
+            result: str | None = cached[1]
             self.output.write(f'Gotten from cache: {result}\n')
             return result
 
-        self.output.write(f'No cache. {cache=}; {mtime=}\n')
+        self.output.write(f'No cache. {cached=}; {mtime=}\n')
         return 0
 
     def save_status_in_cache(self, status: str | None) -> None:
         plugins.observer.event_queue.join()
-        self.event_handlers[self.git_dir].flag = False
+        handler = self.event_handlers.get(self.git_dir)
+        if handler is not None:
+            handler.flag = False
         self.output.write('Cache saved\n')
 
         # although the event_queue was joined, some thread
@@ -628,7 +1054,7 @@ class High(base.Base):
         time.sleep(0.001)
 
         mtime = self.dirs_mtimes.get(self.git_dir)
-        self.final_result_cache[self.git_dir] = mtime, status
+        self.final_result_cache.put(self.git_dir, (mtime, status))
 
     def handle_files_readden_async(self) -> None:
         while self.files_readden:
@@ -657,21 +1083,27 @@ class High(base.Base):
     # multiproc
     #
 
-    #                 main                                             workers
-    #      __________________________________________________ ___________________________  # noqa
-    #      |                                                | |                         |  # noqa
-    # shm: I init args S status args T set_full_status args C W . . . . W . . . . W . . .  # noqa
+    #                     main                       workers
+    #      ______________________________ ___________________________
+    #      |                            | |                         |
+    # shm: S git_dir index_mtime deadline C W . . . . W . . . . W . . .
+    #
+    # Strings go as LENGTH and utf-8, integers as INTEGER and each W
+    # is a RESULT. The deadline is of `time.monotonic_ns`, 0 for none.
+    # Between S and C the directories go through the `tasks` queue
+    # and None ends the walk of a worker.
     #
 
     def main_collect(self) -> int:
-        # avoid worker infinite loop
-        pos = self.mmap.tell()
-        self.mmap.seek(0)
-        self.mmap.write(MemFlag.EMPTY)
-        self.mmap.seek(pos)
+        if self.walking:
+            # every directory published was walked
+            self.tasks.join()
+            for _ in range(self.workers):
+                self.tasks.put(None)
+            self.walking = False
 
-        # collect
         self.mmap.write(MemFlag.COLLECT)
+        self.wake_workers()
         err = self.main_get_result()
         if self.raised_exception:
             err = 1
@@ -685,142 +1117,133 @@ class High(base.Base):
         self.mmap.write(b'\x00' * length)
         self.mmap.seek(0)
 
-        self.switch = 0
-        self.orders_sent = 0
         self.raised_exception = False
 
         return err
 
-    def shm_get_flag(self) -> bytes:
-        # TODO: implement semaphores
-        pos = self.mmap.tell()
-        flag = self.mmap.read(1)
-        while flag == MemFlag.EMPTY:
-            self.mmap.seek(pos)
-            flag = self.mmap.read(1)
-            time.sleep(4e-5)
+    def wake_workers(self) -> None:
+        """
+        Every worker reads every message, once it's written.
+        """
+        for wake in self.wakes:
+            wake.release()
 
-        return flag
+    def shm_get_flag(self) -> bytes:
+        """
+        Workers only. Blocks until main writes the next message.
+        """
+        self.wake.acquire()
+        return self.mmap.read(1)
 
     def main_get_result(self) -> int:
+        # the results are in the order of the workers, not of arrival
+        for _ in range(self.workers):
+            self.results.acquire()
+
         err = 0
-        for _ in range(self.workers):  # orders_sent
-            flag = self.shm_get_flag()
+        for _ in range(self.workers):
+            flag, untracked, staged, modified, deleted = RESULT.unpack(
+                self.mmap.read(RESULT.size)
+            )
             if flag == MemFlag.ERROR:
                 err = 1
-
             if err:
-                self.mmap.read(8)
                 continue
 
-            self.untracked += int.from_bytes(
-                self.mmap.read(2), byteorder='little'
-            )
-            self.staged += int.from_bytes(
-                self.mmap.read(2), byteorder='little'
-            )
-            self.modified += int.from_bytes(
-                self.mmap.read(2), byteorder='little'
-            )
-            # -32768 -> 32767
-            self.deleted += int.from_bytes(
-                self.mmap.read(2), 'little', signed=True
-            )
+            self.untracked += untracked
+            self.staged += staged
+            self.modified += modified
+            self.deleted += deleted
 
         return err
 
-    def write_shm(self, *objs: Any, flag: bytes) -> None:
-        """One call for init, one by load_balancer"""
+    def write_shm(self, *objs: str | int, flag: bytes) -> None:
+        """
+        Writes a message for the workers and wakes them. Strings go
+        with their length.
+        """
         pos = self.mmap.tell()
-        written = 0
         self.mmap.read(1)
 
         for obj in objs:
-            obj_bytes = pickle.dumps(obj, protocol=-1)
-            length = len(obj_bytes)
-            self.mmap.write(length.to_bytes(3, 'little'))
-            self.mmap.write(obj_bytes)
-            written += length + 3
+            if isinstance(obj, str):
+                encoded = obj.encode()
+                self.mmap.write(LENGTH.pack(len(encoded)))
+                self.mmap.write(encoded)
+            else:
+                self.mmap.write(INTEGER.pack(obj))
 
+        end = self.mmap.tell()
         self.mmap.seek(pos)
         self.mmap.write(flag)
-        self.mmap.seek(pos + written + 1)
+        self.mmap.seek(end)
+        self.wake_workers()
+
+    def read_shm_str(self) -> str:
+        (length,) = LENGTH.unpack(self.mmap.read(LENGTH.size))
+        return self.mmap.read(length).decode()
+
+    def read_shm_int(self) -> int:
+        (value,) = INTEGER.unpack(self.mmap.read(INTEGER.size))
+        return value
 
     # workers only
 
     def worker_write_shm_result(self) -> None:
-        self.mmap.read((self.proc_num - 1) * 9)
+        self.mmap.read((self.proc_num - 1) * RESULT.size)
 
         if self.raised_exception:
-            self.mmap.write(MemFlag.ERROR)
+            self.mmap.write(RESULT.pack(MemFlag.ERROR, 0, 0, 0, 0))
             return
 
-        pos = self.mmap.tell()
-        self.mmap.read(1)
-
-        for i in (self.untracked, self.staged, self.modified):
-            self.mmap.write(
-                i.to_bytes(length=2, byteorder='little')
-            )
-
-        self.mmap.write(
-            self.deleted.to_bytes(length=2, byteorder='little', signed=True)
-        )
-
-        self.mmap.seek(pos)
-        self.mmap.write(MemFlag.WORKER_RES)
+        self.mmap.write(RESULT.pack(
+            MemFlag.WORKER_RES,
+            self.untracked, self.staged, self.modified, self.deleted
+        ))
 
-    def worker_init(self) -> None:
-        for it in range(2):
+    def worker_status(self) -> None:
+        self.git_dir = self.read_shm_str()
+        mtime_ns = self.read_shm_int()
+        # the clock is the same for every process
+        self.deadline = self.read_shm_int()
+        # what's kept of it is dropped with it, as in main
+        self.repos.put(self.git_dir, None)
+
+        # parsed again only when it changes, as in main
+        try:
+            self.set_index_tracked()
+        except Exception:
+            self.raised_exception = True
+            return
 
-            length = int.from_bytes(self.mmap.read(3), 'little')
-            recv = pickle.loads(self.mmap.read(length))
+        # changed after main read it
+        if self.index_mtime_ns != mtime_ns:
+            self.raised_exception = True
 
-            if it == 0:
-                self.git_dir = recv
-            elif it == 1:
-                self.branch = recv
+    def worker_walk(self) -> None:
+        """
+        Walks the directories taken from the queue until None. Those
+        found under them may be published back for the idle workers.
+        """
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    break
+                if not self.raised_exception:
+                    relpath, fixed, relative = decode_task(task)
+                    self.set_full_status(
+                        os.path.join(self.git_dir, relpath),
+                        relpath, fixed, relative
+                    )
+            except Exception:
+                self.raised_exception = True
+            finally:
+                self.tasks.task_done()
 
-    def worker_status(self) -> None:
-        for it in range(2):
-
-            length = int.from_bytes(self.mmap.read(3), 'little')
-            recv = pickle.loads(self.mmap.read(length))
-
-            if it == 0:
-                self.index_tracked = recv
-            elif it == 1:
-                self.packs_list = recv
-
-    def worker_handle_turn(self) -> None:
-        for it in range(6):
-
-            length = int.from_bytes(self.mmap.read(3), 'little')
-            recv = pickle.loads(self.mmap.read(length))
-
-            if it == 0:
-                turn = recv
-                if turn != self.proc_num:
-                    # exhaust loop to keep mmaps sync without pickling
-                    for _ in range(5):
-                        length = int.from_bytes(self.mmap.read(3), 'little')
-                        self.mmap.read(length)
-                    return
-
-            elif it == 1:
-                dir_path = recv
-            elif it == 2:
-                tree_hash = recv
-            elif it == 3:
-                relpath = recv
-            elif it == 4:
-                fixed_prev = recv
-            elif it == 5:
-                relative_prev = recv
-
-        self.set_full_status(
-            dir_path, tree_hash, relpath, fixed_prev, relative_prev
-        )
+        if not self.linear and self.read_async:
+            self.handle_files_readden_async()
+            self.files_readden.clear()
 
     def worker_clear(self) -> None:
         self.untracked = 0
@@ -828,21 +1251,22 @@ class High(base.Base):
         self.modified = 0
         self.deleted = 0
         self.raised_exception = False
+        self.untracked_memo.clear()
         self.mmap.seek(0)
         self.output.flush()
+        # the rest is kept for the next status
+        cache.trim_idle()
 
     def worker_mainloop(self) -> None:
         while 1:
             flag = self.shm_get_flag()
 
-            if flag == MemFlag.INIT:
-                self.worker_init()
-            elif flag == MemFlag.STATUS:
+            if flag == MemFlag.STATUS:
                 self.worker_status()
-            elif flag == MemFlag.TURN:
-                self.worker_handle_turn()
+                self.worker_walk()
             elif flag == MemFlag.COLLECT:
                 self.worker_write_shm_result()
+                self.results.release()
                 self.worker_clear()
             elif flag == MemFlag.QUIT:
                 return
@@ -850,14 +1274,105 @@ class High(base.Base):
                 raise RuntimeError('Unreachable')
 
 
+class ThreadedWalk:
+    """
+    A walk of the worktree split among the threads of a pool by
+    directories. Each thread counts on its own copy of High, what
+    `join` sums.
+    """
+    __slots__ = (
+        'obj', 'pool', 'lock', 'done', 'pending', 'submitted',
+        'walkers', 'error'
+    )
+
+    def __init__(self, obj: High, pool: ThreadPoolExecutor) -> None:
+        self.obj = obj
+        self.pool = pool
+        self.lock = th.Lock()
+        self.done = th.Event()
+        # directories submitted and not walked yet
+        self.pending = 0
+        self.submitted = 0
+        # {thread id: walker}
+        self.walkers: dict[int, High] = {}
+        self.error: BaseException | None = None
+
+    def can_submit(self) -> bool:
+        return self.pending < self.obj.threads * PENDING_PER_THREAD
+
+    def submit(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Queues `set_full_status` with the arguments for any thread.
+        """
+        with self.lock:
+            self.pending += 1
+            self.submitted += 1
+        self.pool.submit(self.run, args, kwargs)
+
+    def run(self, args: tuple[Any, ...], kwargs: dict[str, Any]) -> None:
+        try:
+            if self.error is None:
+                self.get_walker().set_full_status(*args, **kwargs)
+        except BaseException as err:
+            self.error = err
+        finally:
+            with self.lock:
+                self.pending -= 1
+                if not self.pending:
+                    self.done.set()
+
+    def get_walker(self) -> High:
+        """
+        return: High: The copy for this thread. Everything is shared but
+                      the counters and the last file read.
+        """
+        ident = th.get_ident()
+        walker = self.walkers.get(ident)
+        if walker is None:
+            walker = copy.copy(self.obj)
+            walker.untracked = 0
+            walker.staged = 0
+            walker.modified = 0
+            walker.deleted = 0
+            walker.walk = self
+            self.walkers[ident] = walker
+
+        return walker
+
+    def join(self) -> None:
+        """
+        Waits for every directory and sums the counters into `obj`.
+        Raises what was raised in a thread.
+        """
+        self.done.wait()
+
+        obj = self.obj
+        # `get_partial_status` sees the counts either in the walkers or
+        # in `obj`, never in both nor in none
+        with self.lock:
+            for walker in self.walkers.values():
+                obj.untracked += walker.untracked
+                obj.staged += walker.staged
+                obj.modified += walker.modified
+                obj.deleted += walker.deleted
+                # kept for the next walk, as by a single walker
+                obj.use_cr = walker.use_cr
+            obj.running_walk = None
+
+        if self.error is not None:
+            raise self.error
+
+
 class EventHandler:
     __slots__ = (
         'obj_ref',
         'flag',
+        'watch',
     )
 
     def __init__(self, obj_ref: High):
         self.obj_ref = obj_ref
+        self.watch: plugins.ObservedWatch | None = None
 
         # flags that dispatch has already been called
         # will be reseted by High obj
@@ -872,6 +1387,6 @@ class EventHandler:
         self.obj_ref.output.write(f'{event}\n')
 
         self.flag = True
-        self.obj_ref.dirs_mtimes[self.obj_ref.git_dir] = time.time()
+        self.obj_ref.dirs_mtimes.put(self.obj_ref.git_dir, time.time())
 
 
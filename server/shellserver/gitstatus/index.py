@@ -0,0 +1,629 @@
+"""
+Low level operations on the git index file.
+https://git-scm.com/docs/index-format
+"""
+
+import os
+import struct
+from typing import NamedTuple
+
+__all__ = (
+    'IndexEntry', 'StatData', 'ParsedIndex', 'UntrackedCache',
+    'read_header', 'parse_entries', 'read_extensions', 'parse_cache_tree',
+    'parse_untracked_cache', 'parse_link', 'merge_split_index',
+    'read_ewah', 'stat_matches', 'is_racy'
+)
+
+HEADER = struct.Struct('>4sLL')
+ENTRY = struct.Struct('>10L20sH')
+ENTRY_SIZE = 62
+
+FLAG_EXTENDED = 0x4000
+NAME_MASK = 0xfff
+EXT_FLAGS = struct.Struct('>H')
+# extended flags are kept above the 16 bits of flags
+FLAG_INTENT_TO_ADD = 0x2000 << 16
+FLAG_SKIP_WORKTREE = 0x4000 << 16
+# sparse directory entries of a sparse index
+MODE_SPARSE_DIR = 0o040000
+EXT_HEADER = struct.Struct('>4sL')
+HASH_SIZE = 20
+STAT_DATA = struct.Struct('>9L')
+EWAH_HEADER = struct.Struct('>LL')
+
+
+class IndexEntry(NamedTuple):
+    ctime_s: int
+    ctime_ns: int
+    mtime_s: int
+    mtime_ns: int
+    dev: int
+    ino: int
+    mode: int
+    uid: int
+    gid: int
+    size: int
+    sha: bytes
+    flags: int
+
+
+class StatData(NamedTuple):
+    """
+    Stat data of the untracked cache, fields named as in `IndexEntry`.
+    """
+    ctime_s: int
+    ctime_ns: int
+    mtime_s: int
+    mtime_ns: int
+    dev: int
+    ino: int
+    uid: int
+    gid: int
+    size: int
+
+
+class UntrackedCache:
+    """
+    Content of the untracked cache (UNTR) extension.
+    """
+    __slots__ = (
+        'idents',
+        'info_exclude',
+        'excludes_file',
+        'dir_flags',
+        'exclude_per_dir',
+        'dirs',
+    )
+
+    def __init__(
+        self,
+        idents: list[str],
+        info_exclude: StatData,
+        excludes_file: StatData,
+        dir_flags: int,
+        exclude_per_dir: str,
+        dirs: dict[str, tuple[StatData, frozenset[str], str | None]]
+    ) -> None:
+        self.idents = idents
+        self.info_exclude = info_exclude
+        self.excludes_file = excludes_file
+        self.dir_flags = dir_flags
+        self.exclude_per_dir = exclude_per_dir
+        # {relpath: (stat_data, untracked_names, gitignore_hash)}
+        # valid directories only, untracked directories end with '/'
+        self.dirs = dirs
+
+
+class ParsedIndex:
+    """
+    Entries and the used extensions of an index file.
+    """
+    __slots__ = (
+        'version',
+        'entries',
+        'cache_tree',
+        'untracked_cache',
+        'sparse',
+        'skip_worktree',
+        'intent_to_add',
+        '_files',
+        '_subdirs',
+        '_counts',
+        '_skipped',
+    )
+
+    def __init__(
+        self,
+        version: int,
+        entries: dict[str, IndexEntry],
+        extensions: dict[bytes, bytes]
+    ) -> None:
+        self.version = version
+        self.entries = entries
+
+        # {relpath: (tree_hash, entry_count, subtrees)}, valid ones only
+        self.cache_tree: dict[str, tuple[str, int, list[str]]] = {}
+        if b'TREE' in extensions:
+            self.cache_tree = parse_cache_tree(extensions[b'TREE'])
+
+        self.untracked_cache: UntrackedCache | None = None
+        if b'UNTR' in extensions:
+            self.untracked_cache = parse_untracked_cache(
+                extensions[b'UNTR']
+            )
+
+        # entries ending in '/' with MODE_SPARSE_DIR are directories
+        # outside of the sparse-checkout cone
+        self.sparse = b'sdir' in extensions
+
+        # extended flags are only written by version 3 and later
+        self.skip_worktree = 0
+        self.intent_to_add = 0
+        if version >= 3:
+            for entry in entries.values():
+                if entry.flags & FLAG_SKIP_WORKTREE:
+                    self.skip_worktree += 1
+                if entry.flags & FLAG_INTENT_TO_ADD:
+                    self.intent_to_add += 1
+
+        # built on demand, keyed by the relpath of the directory
+        self._files: dict[str, dict[str, IndexEntry]] = {}
+        self._subdirs: dict[str, set[str]] = {}
+        self._counts: dict[str, int] = {}
+        self._skipped: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _build_dirs(self) -> None:
+        sparse = self.sparse
+        files: dict[str, dict[str, IndexEntry]] = {}
+        for path, entry in self.entries.items():
+            if sparse and path[-1] == '/':
+                path = path[:-1]
+            dirname, _, name = path.rpartition('/')
+            dir_files = files.get(dirname)
+            if dir_files is None:
+                dir_files = files[dirname] = {}
+            dir_files[name] = entry
+
+        subdirs: dict[str, set[str]] = {}
+        counts: dict[str, int] = {'': 0}
+        skipped: dict[str, int] = {}
+        for dirname, dir_files in files.items():
+            count = len(dir_files)
+            if self.intent_to_add:
+                count -= sum(
+                    1 for entry in dir_files.values()
+                    if entry.flags & FLAG_INTENT_TO_ADD
+                )
+            if self.skip_worktree:
+                skipped[dirname] = sum(
+                    1 for entry in dir_files.values()
+                    if entry.flags & FLAG_SKIP_WORKTREE
+                )
+
+            counts[''] += count
+            while dirname:
+                if dirname not in counts:
+                    counts[dirname] = 0
+                    parent, _, name = dirname.rpartition('/')
+                    subdirs.setdefault(parent, set()).add(name)
+                counts[dirname] += count
+                dirname = dirname.rpartition('/')[0]
+
+        self._files = files
+        self._subdirs = subdirs
+        self._counts = counts
+        self._skipped = skipped
+
+    def has_dir(self, relpath: str) -> bool:
+        """
+        Checks if there are entries under the directory `relpath`.
+        """
+        if not self._counts:
+            self._build_dirs()
+
+        return relpath in self._counts
+
+    def count(self, relpath: str) -> int:
+        """
+        Gets the number of entries under the directory `relpath`,
+        intent-to-add ones excluded.
+        """
+        if not self._counts:
+            self._build_dirs()
+
+        return self._counts.get(relpath, 0)
+
+    def count_skip_worktree(self, relpath: str) -> int:
+        """
+        Gets the number of skip-worktree entries directly under
+        the directory `relpath`.
+        """
+        if not self._counts:
+            self._build_dirs()
+
+        return self._skipped.get(relpath, 0)
+
+    def get_files(self, relpath: str) -> dict[str, IndexEntry]:
+        """
+        Gets the entries directly under the directory `relpath`.
+        return: dict: {filename: entry}
+        """
+        if not self._counts:
+            self._build_dirs()
+
+        return self._files.get(relpath, {})
+
+    def get_subdirs(self, relpath: str) -> set[str]:
+        """
+        Gets the names of the directories directly under `relpath`
+        that have entries.
+        """
+        if not self._counts:
+            self._build_dirs()
+
+        return self._subdirs.get(relpath, set())
+
+
+def read_header(data: bytes) -> tuple[int, int] | None:
+    """
+    Reads the header of an index file.
+    param `data`: The whole content of the index file.
+    return: tuple | None: version and number of entries, None if `data`
+                          isn't a supported index.
+    """
+    if len(data) < HEADER.size:
+        return None
+
+    constant, version, entries = HEADER.unpack_from(data)
+    if constant != b'DIRC' or version not in (2, 3, 4):
+        return None
+
+    return version, entries
+
+
+def decode_varint(data: bytes | memoryview, pos: int) -> tuple[int, int]:
+    """
+    Decodes the offset encoded integer used by index v4.
+    return: tuple: The value and the position after it.
+    """
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7f
+
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+
+    return value, pos
+
+
+def parse_entries(
+    data: bytes,
+    version: int,
+    entries: int,
+    replacements: list[IndexEntry] | None = None,
+    in_order: list[tuple[str, IndexEntry]] | None = None
+) -> tuple[dict[str, IndexEntry], int]:
+    """
+    Parses the entries of an index file read in a single call.
+    Extended flags are or'ed to `flags` shifted by 16 bits.
+    param `data`: The whole content of the index file.
+    param `version`: As returned by `read_header`.
+    param `entries`: As returned by `read_header`.
+    param `replacements`: For a split index, receives the entries
+                          without name, in order.
+    param `in_order`: For a shared index, receives every entry with its
+                      relpath, in order. The stages of a conflict are
+                      one key of the dict but each has its position.
+    return: tuple: {relpath: IndexEntry} and the position
+                   where the extensions begin.
+    """
+    view = memoryview(data)
+    unpack_from = ENTRY.unpack_from
+    make = IndexEntry._make
+    find = data.index
+
+    res: dict[str, IndexEntry] = {}
+    pos = HEADER.size
+    prev_name = b''
+
+    for _ in range(entries):
+        values = unpack_from(view, pos)
+        flags = values[11]
+
+        start = pos
+        pos += ENTRY_SIZE
+        if flags & FLAG_EXTENDED:
+            ext_flags = EXT_FLAGS.unpack_from(view, pos)[0]
+            values = values[:11] + (flags | ext_flags << 16,)
+            pos += 2
+
+        if version == 4:
+            # name is prefix compressed against the previous one
+            strip, pos = decode_varint(view, pos)
+            stop = find(b'\x00', pos)
+            name = prev_name[:len(prev_name) - strip] + data[pos:stop]
+            prev_name = name
+            pos = stop + 1
+
+        else:
+            namelen = flags & NAME_MASK
+            if namelen == NAME_MASK:
+                namelen = find(b'\x00', pos) - pos
+
+            name = data[pos:pos + namelen]
+            # entries are NUL padded to a multiple of eight bytes
+            pos = start + ((pos - start + namelen + 8) & ~7)
+
+        if not name and replacements is not None:
+            replacements.append(make(values))
+        else:
+            entry = make(values)
+            relpath = name.decode()
+            res[relpath] = entry
+            if in_order is not None:
+                in_order.append((relpath, entry))
+
+    return res, pos
+
+
+def read_extensions(data: bytes, pos: int) -> dict[bytes, bytes]:
+    """
+    Reads the extensions after the entries.
+    return: dict: {signature: content}
+    """
+    res = {}
+    end = len(data) - HASH_SIZE
+
+    while pos + EXT_HEADER.size <= end:
+        signature, size = EXT_HEADER.unpack_from(data, pos)
+        pos += EXT_HEADER.size
+        res[signature] = data[pos:pos + size]
+        pos += size
+
+    return res
+
+
+def parse_cache_tree(data: bytes) -> dict[str, tuple[str, int, list[str]]]:
+    """
+    Parses the cache-tree (TREE) extension. Invalidated directories
+    are left out, which makes their parents invalid too.
+    return: dict: {relpath: (tree_hash, entry_count, subtrees)}
+    """
+    res: dict[str, tuple[str, int, list[str]]] = {}
+    # [[relpath, subtrees left to read]]
+    stack: list[list] = []
+    find = data.index
+    pos = 0
+
+    while pos < len(data):
+        stop = find(b'\x00', pos)
+        name = data[pos:stop].decode()
+        pos = stop + 1
+
+        stop = find(b' ', pos)
+        entry_count = int(data[pos:stop])
+        pos = stop + 1
+
+        stop = find(b'\n', pos)
+        subtrees_count = int(data[pos:stop])
+        pos = stop + 1
+
+        relpath = name
+        if stack:
+            parent = stack[-1]
+            parent[1] -= 1
+            if parent[0]:
+                relpath = f'{parent[0]}/{name}'
+
+        if entry_count >= 0:
+            tree_hash = data[pos:pos + HASH_SIZE].hex()
+            pos += HASH_SIZE
+            res[relpath] = tree_hash, entry_count, []
+
+        if stack and stack[-1][0] in res:
+            res[stack[-1][0]][2].append(name)
+
+        stack.append([relpath, subtrees_count])
+        while stack and not stack[-1][1]:
+            stack.pop()
+
+    return res
+
+
+def parse_link(data: bytes) -> tuple[str, set[int], set[int]]:
+    """
+    Parses the split index (link) extension.
+    return: tuple: The hash of the shared index and the positions of
+                   its entries that were deleted and replaced.
+    """
+    shared = data[:HASH_SIZE].hex()
+    if len(data) == HASH_SIZE:
+        return shared, set(), set()
+
+    delete, pos = read_ewah(data, HASH_SIZE)
+    replace, _ = read_ewah(data, pos)
+    return shared, delete, replace
+
+
+def merge_split_index(
+    shared: list[tuple[str, IndexEntry]],
+    entries: dict[str, IndexEntry],
+    replacements: list[IndexEntry],
+    delete: set[int],
+    replace: set[int]
+) -> dict[str, IndexEntry]:
+    """
+    Applies the entries of a split index over its shared index.
+    param `shared`: The entries of the shared index with their relpath,
+                    in order, the positions of the bitmaps.
+    param `entries`: The entries with name of the split index.
+    param `replacements`: The entries without name of the split index.
+    return: dict: {relpath: IndexEntry}
+    """
+    if not delete and not replace:
+        res = dict(shared)
+        res.update(entries)
+        return res
+
+    res = {}
+    replacements_iter = iter(replacements)
+    for pos, (name, entry) in enumerate(shared):
+        if pos in replace:
+            entry = next(replacements_iter, entry)
+        if pos not in delete:
+            res[name] = entry
+
+    res.update(entries)
+    return res
+
+
+def read_ewah(data: bytes, pos: int) -> tuple[set[int], int]:
+    """
+    Reads an EWAH compressed bitmap.
+    return: tuple: The positions of the set bits and the position
+                   after the bitmap.
+    """
+    bit_size, words_count = EWAH_HEADER.unpack_from(data, pos)
+    pos += EWAH_HEADER.size
+    words = struct.unpack_from(f'>{words_count}Q', data, pos)
+    # the words are followed by the position of the last marker word
+    pos += words_count * 8 + 4
+
+    res: set[int] = set()
+    bit = 0
+    ind = 0
+    while ind < words_count:
+        # marker word: running bit, running length and literal words count
+        marker = words[ind]
+        ind += 1
+        running_len = ((marker >> 1) & 0xffffffff) * 64
+        if marker & 1:
+            res.update(range(bit, bit + running_len))
+        bit += running_len
+
+        for word in words[ind:ind + (marker >> 33)]:
+            while word:
+                low = word & -word
+                res.add(bit + low.bit_length() - 1)
+                word ^= low
+            bit += 64
+        ind += marker >> 33
+
+    return {i for i in res if i < bit_size}, pos
+
+
+def parse_untracked_cache(data: bytes) -> UntrackedCache | None:
+    """
+    Parses the untracked cache (UNTR) extension.
+    return: UntrackedCache | None: None if it isn't a supported one.
+    """
+    find = data.index
+
+    size, pos = decode_varint(data, 0)
+    idents = [i.decode() for i in data[pos:pos + size].split(b'\x00') if i]
+    pos += size
+
+    info_exclude = StatData._make(STAT_DATA.unpack_from(data, pos))
+    pos += STAT_DATA.size
+    excludes_file = StatData._make(STAT_DATA.unpack_from(data, pos))
+    pos += STAT_DATA.size
+    dir_flags = int.from_bytes(data[pos:pos + 4], 'big')
+    # hashes of info/exclude and core.excludesFile, stat data is enough
+    pos += 4 + HASH_SIZE * 2
+
+    stop = find(b'\x00', pos)
+    exclude_per_dir = data[pos:stop].decode()
+    pos = stop + 1
+
+    dirs_count, pos = decode_varint(data, pos)
+
+    # [(relpath, untracked_names)] in depth-first order
+    blocks: list[tuple[str, frozenset[str]]] = []
+    # [[relpath, subdirectories left to read]]
+    stack: list[list] = []
+
+    for _ in range(dirs_count):
+        untracked_count, pos = decode_varint(data, pos)
+        subdirs_count, pos = decode_varint(data, pos)
+
+        stop = find(b'\x00', pos)
+        name = data[pos:stop].decode()
+        pos = stop + 1
+
+        names = []
+        for _ in range(untracked_count):
+            stop = find(b'\x00', pos)
+            names.append(data[pos:stop].decode())
+            pos = stop + 1
+
+        relpath = name
+        if stack:
+            parent = stack[-1]
+            parent[1] -= 1
+            if parent[0]:
+                relpath = f'{parent[0]}/{name}'
+
+        blocks.append((relpath, frozenset(names)))
+
+        stack.append([relpath, subdirs_count])
+        while stack and not stack[-1][1]:
+            stack.pop()
+
+    dirs: dict[str, tuple[StatData, frozenset[str], str | None]] = {}
+    if not dirs_count:
+        return UntrackedCache(
+            idents, info_exclude, excludes_file,
+            dir_flags, exclude_per_dir, dirs
+        )
+
+    valid, pos = read_ewah(data, pos)
+    check_only, pos = read_ewah(data, pos)
+    hash_valid, pos = read_ewah(data, pos)
+
+    stats = {}
+    for ind in sorted(valid):
+        stats[ind] = StatData._make(STAT_DATA.unpack_from(data, pos))
+        pos += STAT_DATA.size
+
+    hashes = {}
+    for ind in sorted(hash_valid):
+        hashes[ind] = data[pos:pos + HASH_SIZE].hex()
+        pos += HASH_SIZE
+
+    for ind, (relpath, untracked) in enumerate(blocks):
+        # check only: git just looked for any untracked file
+        if ind in valid and ind not in check_only:
+            dirs[relpath] = stats[ind], untracked, hashes.get(ind)
+
+    return UntrackedCache(
+        idents, info_exclude, excludes_file,
+        dir_flags, exclude_per_dir, dirs
+    )
+
+
+def stat_matches(entry: IndexEntry | StatData, st: os.stat_result) -> bool:
+    """
+    Compares the stat data recorded in `entry` with `st`
+    in the same way of git's `ie_match_stat`.
+    Fields that git left as zero (e.g. inode on Windows) aren't compared.
+    """
+    # the index keeps only the lower 32 bits
+    if entry.size != st.st_size & 0xffffffff:
+        return False
+
+    mtime_s, mtime_ns = divmod(st.st_mtime_ns, 1000000000)
+    if entry.mtime_s != mtime_s & 0xffffffff:
+        return False
+    if entry.mtime_ns and entry.mtime_ns != mtime_ns:
+        return False
+
+    if entry.ctime_s:
+        ctime_s, ctime_ns = divmod(st.st_ctime_ns, 1000000000)
+        if entry.ctime_s != ctime_s & 0xffffffff:
+            return False
+        if entry.ctime_ns and entry.ctime_ns != ctime_ns:
+            return False
+
+    for recorded, actual in (
+        (entry.ino, st.st_ino),
+        (entry.dev, st.st_dev),
+        (entry.uid, st.st_uid),
+        (entry.gid, st.st_gid),
+    ):
+        if recorded and recorded != actual & 0xffffffff:
+            return False
+
+    return True
+
+
+def is_racy(entry: IndexEntry | StatData, index_mtime_ns: int) -> bool:
+    """
+    An entry modified at or after the index was written may have changed
+    again without changing its stat data and must have its content checked.
+    """
+    return entry.mtime_s * 1000000000 + entry.mtime_ns >= index_mtime_ns
@@ -10,10 +10,14 @@ gitstatus(path)
 import io
 import os
 import threading as th
-from typing import Any
+import time
+from typing import Any, Callable
 
+from . import cache
 from . import high
 from . import plugins
+from . import refs
+from . import selector
 
 OS_CPU_COUNT = os.cpu_count() or 1
 
@@ -22,6 +26,7 @@ class Config:
     use_git: bool = False
     use_pygit2: bool = False
     git_timeout: int = 2500
+    status_deadline: int = 0
     let_crash: bool = False
     test_status: bool = False  # used only when linear == True
     linear: bool = False
@@ -30,18 +35,26 @@ class Config:
     workers: int = OS_CPU_COUNT - 1
     read_async: bool = True
     fallback: bool = True
+    adaptive: bool = True
+    backends_path: str | None = None
+    dirty_only: bool = False
+    threaded: bool = False
+    index_cache_entries: int = 16
+    index_cache_bytes: int = 64 * 1024 * 1024
     output: io.TextIOWrapper | io.StringIO | None = None
 
 
 interface_only = {
     'use_git', 'use_pygit2',
-    'git_timeout', 'let_crash', 'test_status'
+    'git_timeout', 'status_deadline', 'let_crash', 'test_status',
+    'adaptive', 'backends_path'
 }
 both = {
     'linear', 'watchdog'
 }
 instance_only = {
-    'multiproc', 'workers', 'read_async', 'fallback', 'output'
+    'multiproc', 'workers', 'read_async', 'fallback', 'output', 'dirty_only',
+    'index_cache_entries', 'index_cache_bytes', 'threaded'
 }
 
 
@@ -62,16 +75,28 @@ def gitstatus(target_path: str) -> tuple[str | None, str | None]:
     if branch.startswith('detached at '):
         return branch, None
 
+    # one `git_timeout` for stopping the old status and getting this one.
+    # Seems non-pythonic but pypy needs this casting to float
+    timeout_at = time.monotonic() + float(Config.git_timeout) / 1000
+
+    # the status of other repo is stopped before `obj` moves to this one
+    if _Globals.thread.is_alive() and _Globals.thread_git_dir != git_dir:
+        _Globals.obj.cancel()
+        _Globals.thread.join(timeout=_get_time_left(timeout_at))
+        # not cancellable, as when git is run
+        if _Globals.thread.is_alive():
+            return branch, '...'
+
     _Globals.obj.init(git_dir, branch)
 
     if plugins.HAS_WATCHDOG and Config.watchdog:
-        cache = _Globals.obj.get_cached_result()
+        cached = _Globals.obj.get_cached_result()
         # returns int when there's no cache
-        if not isinstance(cache, int):
-            return branch, cache
+        if not isinstance(cached, int):
+            return branch, cached
 
     _Globals.status = '...'
-    status = _get_status()
+    status = _get_status(timeout_at)
 
     return branch, status
 
@@ -85,6 +110,13 @@ def update_conf(opt: str, val: bool) -> None:
     elif opt in instance_only:
         setattr(_Globals.obj, opt, val)
 
+    # the results cached were got in the other mode
+    if opt == 'dirty_only':
+        _Globals.obj.final_result_cache.clear()
+    # a running status closes it itself, its walk may be using it
+    elif opt == 'threaded' and not val and not _Globals.thread.is_alive():
+        _Globals.obj.close_pool()
+
 
 def set_config(Cls_config: Any) -> None:
     """
@@ -106,33 +138,116 @@ def init() -> None:
     }
     _Globals.obj = high.High(**config)
 
+    backends: tuple[str, ...] = (selector.NATIVE, selector.GIT)
+    if plugins.HAS_PYGIT2:
+        backends += (selector.PYGIT2,)
+    _Globals.selector = selector.Selector(Config.backends_path, backends)
+
 
 def cleanup() -> None:
-    _Globals.obj._write_buffer()
+    _Globals.selector.save()
+    # nothing is dropped under a status still being got
+    if not _Globals.thread.is_alive():
+        cache.trim_idle()
+
+
+def finish() -> None:
+    _Globals.selector.save(force=True)
+    _Globals.obj.close_pool()
+    _Globals.obj.close_packs()
 
 
 def _populate_status() -> None:
-    if Config.use_git:
-        status = _Globals.obj.parse_git_status()
-    elif Config.use_pygit2:
-        status = _Globals.obj.parse_pygit2()
-    else:
-        try:
-            status = _Globals.obj.status()
-        except high.FallbackError:
-            status = _Globals.obj.parse_git_status()
-        except Exception:
-            if Config.let_crash:
-                raise
-            status = _Globals.obj.parse_git_status()
+    try:
+        status = _get_status_by_config()
+    # superseded or past the deadline, never cached
+    except high.CancelledError as err:
+        _Globals.status = err.partial or '...'
+        return
+    # on Windows git can't delete nor rename over a mapped file, as
+    # gc and repack do, so nothing stays mapped between statuses
+    finally:
+        _Globals.obj.close_packs()
 
     _Globals.status = status
     if plugins.HAS_WATCHDOG and Config.watchdog:
         _Globals.obj.save_status_in_cache(status)
 
 
-def _get_status() -> str | None:
+def _get_status_by_config() -> str | None:
+    if Config.use_git:
+        return _Globals.obj.parse_git_status()
+    if Config.use_pygit2:
+        return _Globals.obj.parse_pygit2()
+    if Config.adaptive:
+        return _get_status_by_selector()
+
+    try:
+        return _Globals.obj.status()
+    except high.CancelledError:
+        raise
+    except high.FallbackError:
+        return _Globals.obj.parse_git_status()
+    except Exception:
+        if Config.let_crash:
+            raise
+        return _Globals.obj.parse_git_status()
+
+
+def _get_status_by_selector() -> str | None:
+    obj = _Globals.obj
+    # the index size only routes repos not measured yet, then the
+    # latency decides
+    fallback = obj.fallback and obj.git_dir not in _Globals.selector.repos
+    backends: dict[str, Callable[[], str | None]] = {
+        selector.NATIVE: lambda: obj.status(fallback),
+        selector.GIT: obj.parse_git_status,
+        selector.PYGIT2: obj.parse_pygit2,
+    }
+
+    backend = _Globals.selector.choose(obj.git_dir)
+    obj.output.write(f'Backend: {backend}\n')
+
+    status = None
+    reason = None
+    init = time.perf_counter()
+    try:
+        status = backends[backend]()
+    # not the latency of the backend
+    except high.CancelledError:
+        raise
+    except high.FallbackError as err:
+        reason = str(err) or 'fallback'
+    except Exception as err:
+        if Config.let_crash:
+            raise
+        reason = repr(err)
+
+    took = (time.perf_counter() - init) * 1000
+    _Globals.selector.record(obj.git_dir, backend, took, reason)
+    if reason is None or backend == selector.GIT:
+        return status
+
+    obj.output.write(f'Backend {backend} failed: {reason}\n')
+    init = time.perf_counter()
+    status = obj.parse_git_status()
+    took = (time.perf_counter() - init) * 1000
+    _Globals.selector.record(obj.git_dir, selector.GIT, took)
+
+    return status
+
+
+def _get_time_left(timeout_at: float) -> float:
+    """
+    return: float: The seconds until `timeout_at`, of `time.monotonic`.
+    """
+    return max(0.0, timeout_at - time.monotonic())
+
+
+def _get_status(timeout_at: float) -> str | None:
+    deadline = float(Config.status_deadline) / 1000 or None
     if Config.linear:
+        _Globals.obj.set_deadline(deadline)
         _populate_status()
         status = _Globals.status
         if Config.test_status and not Config.use_git:
@@ -142,12 +257,19 @@ def _get_status() -> str | None:
 
     if not _Globals.thread.is_alive():
         _Globals.thread = th.Thread(target=_populate_status)
+        _Globals.thread_git_dir = _Globals.obj.git_dir
+        _Globals.obj.set_deadline(deadline)
         _Globals.thread.start()
 
-    # Seems non-pythonic but pypy needs this casting to float
-    # or `timeout` will be int
-    timeout = float(Config.git_timeout) / 1000
-    _Globals.thread.join(timeout=timeout)
+    # what the cancel of other repo's status left
+    _Globals.thread.join(timeout=_get_time_left(timeout_at))
+
+    # what was found so far, better than '...'
+    if (
+        _Globals.thread.is_alive()
+        and _Globals.thread_git_dir == _Globals.obj.git_dir
+    ):
+        return _Globals.obj.get_partial_status() or _Globals.status
 
     return _Globals.status
 
@@ -171,19 +293,19 @@ def _exists_head(git_dir: str) -> bool:
 
 
 def _get_branch_on_head(git_dir: str) -> str:
-    head_path = os.path.join(git_dir, '.git/HEAD')
-
-    with open(head_path) as head:
-        content = head.read()
+    content = refs.read_loose(git_dir, 'HEAD') or ''
 
-    # `content` can be an sha1 or path-like
-    if '/' in content:
-        return content[content.rindex('/') + 1:].strip()
+    # `content` can be an sha1 or a symbolic ref
+    if content.startswith(refs.SYMREF):
+        return content.removeprefix(refs.SYMREF).removeprefix(refs.HEADS)
 
     return f'detached at {content[:7]}'
 
 
 class _Globals:
     obj: high.High
+    selector: selector.Selector
     thread: th.Thread = th.Thread(target=_populate_status)
+    # the repo of the status `thread` gets
+    thread_git_dir: str | None = None
     status: str | None = '...'
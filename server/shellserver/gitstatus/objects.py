@@ -0,0 +1,146 @@
+"""
+Low level reading of the zlib streams of git objects, loose or packed.
+"""
+
+import zlib
+from mmap import mmap
+
+__all__ = ('Tree', 'inflate', 'parse_loose_header', 'parse_tree')
+
+# input fed after the first chunk, when it wasn't enough
+CHUNK_SIZE = 64 * 1024
+# zlib header and checksum, besides the deflated data
+ZLIB_OVERHEAD = 16
+# 'commit ' and the biggest size that fits in 64 bits, with the null
+LOOSE_HEADER_MAX = 28
+SHA_SIZE = 20
+
+MODE_TREE = 0o40000
+MODE_GITLINK = 0o160000
+# modes of tree entries as written by git
+MODES = {
+    b'100644': 0o100644,
+    b'100755': 0o100755,
+    b'120000': 0o120000,
+    b'40000': MODE_TREE,
+    b'160000': MODE_GITLINK,
+}
+
+
+class Tree:
+    """
+    A parsed tree object, its entries by name and split by kind.
+    SHAs are kept raw, as in the index entries.
+    """
+    __slots__ = ('blobs', 'trees', 'links')
+
+    def __init__(self) -> None:
+        # {name: (mode, sha)} files and symlinks
+        self.blobs: dict[str, tuple[int, bytes]] = {}
+        # {name: sha}
+        self.trees: dict[str, bytes] = {}
+        # {name: sha} commits of submodules
+        self.links: dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self.blobs) + len(self.trees) + len(self.links)
+
+    def get_file(self, name: str) -> tuple[int, bytes] | None:
+        """
+        return: tuple | None: The mode and the sha of what isn't a tree,
+                              as kept by the index, None if not there.
+        """
+        item = self.blobs.get(name)
+        if item is None and name in self.links:
+            return MODE_GITLINK, self.links[name]
+
+        return item
+
+    def __repr__(self) -> str:
+        return (
+            f'{len(self.blobs)} blobs, {len(self.trees)} trees, '
+            f'{len(self.links)} links'
+        )
+
+
+def inflate(
+    data: mmap | bytes,
+    pos: int = 0,
+    size_hint: int = 0,
+    limit: int = 0
+) -> tuple[bytes, int]:
+    """
+    Inflates the zlib stream that starts at `pos`, feeding the input in
+    chunks and stopping at the end of the stream.
+    param `size_hint`: The expected size of the output. The first chunk
+                       is as big, what fits most streams at once.
+    param `limit`: Bytes of output wanted, 0 for the whole stream.
+    return: tuple: The output and the position after the stream,
+                   only meaningful for the whole stream.
+    """
+    decomp = zlib.decompressobj()
+    out = []
+    got = 0
+    chunk = (size_hint or CHUNK_SIZE) + ZLIB_OVERHEAD
+    if limit:
+        # no more input is needed than the output wanted
+        chunk = min(chunk, limit + ZLIB_OVERHEAD)
+
+    while not decomp.eof and not (limit and got >= limit):
+        # input held back by a limit on the output
+        if decomp.unconsumed_tail:
+            piece = decomp.unconsumed_tail
+        else:
+            piece = data[pos:pos + chunk]
+            if not piece:
+                raise zlib.error('Truncated zlib stream')
+            pos += len(piece)
+            chunk = CHUNK_SIZE
+
+        res = decomp.decompress(piece, limit - got if limit else 0)
+        out.append(res)
+        got += len(res)
+
+    return b''.join(out), pos - len(decomp.unused_data)
+
+
+def parse_loose_header(data: bytes) -> tuple[str, int, int]:
+    """
+    Parses the header of an inflated loose object, like b'blob 12\\x00'.
+    return: tuple: The type, the size and where the content starts.
+    """
+    end = data.index(b'\x00')
+    type_, _, size = data[:end].partition(b' ')
+    return type_.decode(), int(size), end + 1
+
+
+def parse_tree(data: bytes, pos: int = 0) -> Tree:
+    """
+    Parses the entries of a tree object in one pass.
+    param `data`: The inflated object.
+    param `pos`: Where the entries start, after the header if loose.
+    return: Tree: The entries by name.
+    """
+    tree = Tree()
+    blobs = tree.blobs
+    trees = tree.trees
+    links = tree.links
+    end = len(data)
+
+    while pos < end:
+        # the name may have spaces, the sha may have null bytes
+        sep = data.index(b' ', pos)
+        stop = data.index(b'\x00', sep)
+        mode = data[pos:sep]
+        name = data[sep + 1:stop].decode()
+        pos = stop + 1 + SHA_SIZE
+        sha = data[stop + 1:pos]
+
+        if mode == b'40000':
+            trees[name] = sha
+        elif mode == b'160000':
+            links[name] = sha
+        else:
+            blobs[name] = MODES.get(mode) or int(mode, 8), sha
+
+    return tree
@@ -3,99 +3,475 @@ Low level operations on packfiles.
 """
 
 import os
-import zlib
-from io import BytesIO, BufferedReader
-from collections import deque
+import struct
+from mmap import mmap, ACCESS_READ
+from typing import Iterable
+
+from . import cache
+from . import objects
+from .utils import open_shared
+
+OFS_DELTA = 6
+REF_DELTA = 7
+
+IDX_HEADER = struct.Struct('>4sL')
+IDX_MAGIC = b'\xfftOc'
+FANOUT = struct.Struct('>256L')
+SHA_SIZE = 20
+# offsets with the msb set index the table of 8 bytes offsets
+LARGE_OFFSET = 0x80000000
+
+MIDX_NAME = 'multi-pack-index'
+MIDX_HEADER = struct.Struct('>4sBBBBL')
+MIDX_MAGIC = b'MIDX'
+CHUNK = struct.Struct('>4sQ')
+# pack number and offset of an object in the midx
+PACK_OFFSET = struct.Struct('>LL')
+# pack number and position in its idx of an object in a merged index
+LOCATION = struct.Struct('>HL')
+# without a midx, the idx files are merged for at least this many packs
+MERGE_MIN_PACKS = 4
+# and at most this many objects
+MERGE_MAX_OBJECTS = 500_000
+
+
+def read_delta_size(delta: bytes, pos: int) -> tuple[int, int]:
+    """
+    Reads one of the sizes at the start of a delta.
+    return: tuple: The size and the position after it.
+    """
+    size = shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """
+    Builds an object from its base and a delta of a packfile.
+    param `base`: The content of the base object.
+    param `delta`: The decompressed delta data.
+    return: bytes: The content of the object.
+    """
+    pos = 0
+    # sizes of the base and of the result
+    for _ in range(2):
+        while delta[pos] & 0x80:
+            pos += 1
+        pos += 1
+
+    res = bytearray()
+    end = len(delta)
+
+    while pos < end:
+        opcode = delta[pos]
+        pos += 1
+
+        # copy from base, the bits tell which offset and size bytes follow
+        if opcode & 0x80:
+            offset = size = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    offset |= delta[pos] << (i * 8)
+                    pos += 1
+            for i in range(3):
+                if opcode & (0x10 << i):
+                    size |= delta[pos] << (i * 8)
+                    pos += 1
+            res += base[offset:offset + (size or 0x10000)]
+
+        # insert the next `opcode` bytes
+        elif opcode:
+            res += delta[pos:pos + opcode]
+            pos += opcode
 
+        else:
+            raise ValueError('Invalid delta opcode')
 
-class Packs:
-    # {'path': (mtime, buffer)}
-    bytes_io_cache: dict[str, tuple[float, BytesIO]] = {}
-    # [(mtime, path, stream)]
-    streams_to_transform_in_bytes_io: deque[
-        tuple[float, str, BufferedReader]
-    ] = deque()
+    return bytes(res)
 
-    __slots__ = ()
 
-    def search_idx(
-            self,
-            idx_path: str,
-            hash_: str
-    ) -> int | None:
+class ShaTable:
+    """
+    Sorted table of SHAs with a fanout, as in idx and midx files.
+    """
+    __slots__ = ('data', 'fanout', 'count', 'sha_start')
+
+    data: mmap | bytes
+    fanout: tuple[int, ...]
+    count: int
+    sha_start: int
+
+    def __len__(self) -> int:
+        return self.count
+
+    def find(self, sha: bytes) -> int:
         """
-        Searches given `idx_path` for `hash_`.
-        param `idx_path`: The path of the pack index file.
-        param `hash_`: The hash to be searched.
-        return: int | None: The offset for the hash. None if not found
+        Bisects the SHA table.
+        param `sha`: The 20 bytes SHA.
+        return: int: The position of `sha`, -1 if it isn't there.
         """
+        first = sha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+
+        data = self.data
+        start = self.sha_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = start + mid * SHA_SIZE
+            read = data[pos:pos + SHA_SIZE]
+            if read < sha:
+                lo = mid + 1
+            elif read > sha:
+                hi = mid
+            else:
+                return mid
 
-        idx = int(hash_[:2], 16)
+        return -1
 
-        file = self._get_buffer(idx_path)
 
-        file.seek(8)
-        before = idx - 1
-        if before >= 0:
-            file.seek(before * 4, 1)
-            files_before = int.from_bytes(file.read(4), 'big')
-        else:
-            files_before = 0
+class PackIndex(ShaTable):
+    """
+    Reader of a version 2 pack index (.idx) over its mapping.
+    The fanout table is unpacked once, the SHAs are compared as bytes
+    where they are.
+    """
+    __slots__ = ('offset_start', 'large_start')
 
-        files_after = int.from_bytes(file.read(4), 'big')
+    def __init__(self, data: mmap | bytes) -> None:
+        magic, version = IDX_HEADER.unpack_from(data)
+        if magic != IDX_MAGIC or version != 2:
+            raise ValueError('Unsupported pack index')
 
-        file.seek(1028)
-        total_files = int.from_bytes(file.read(4), 'big')
+        self.data = data
+        self.fanout = FANOUT.unpack_from(data, IDX_HEADER.size)
+        self.count = self.fanout[255]
+        self.sha_start = IDX_HEADER.size + FANOUT.size
+        # the crc32 table is between the SHAs and the offsets
+        self.offset_start = self.sha_start + self.count * (SHA_SIZE + 4)
+        self.large_start = self.offset_start + self.count * 4
 
-        file.seek(1032 + 20 * files_before)
-        read = hex(int.from_bytes(file.read(20), 'big'))[2:].zfill(40)
-        if hash_ == read:
-            return self.get_offset(file, total_files, files_before)
+    def get_offset(self, pos: int) -> int:
+        """
+        return: int: The offset in the pack of the object at `pos`.
+        """
+        start = self.offset_start + pos * 4
+        offset = int.from_bytes(self.data[start:start + 4], 'big')
+        if offset & LARGE_OFFSET:
+            start = self.large_start + (offset & ~LARGE_OFFSET) * 8
+            offset = int.from_bytes(self.data[start:start + 8], 'big')
 
-        file.seek(1032 + 20 * files_after)
-        read = hex(int.from_bytes(file.read(20), 'big'))[2:].zfill(40)
+        return offset
 
-        mid = (files_after - files_before) // 2
-        while mid:
-            file.seek(1032 + 20 * (files_before + mid))
-            read = hex(int.from_bytes(file.read(20), 'big'))[2:].zfill(40)
+    def lookup(self, sha: bytes) -> int | None:
+        """
+        return: int | None: The offset of `sha`, None if not found.
+        """
+        pos = self.find(sha)
+        return None if pos < 0 else self.get_offset(pos)
 
-            if hash_ == read:
-                return self.get_offset(
-                    file, total_files, files_before + mid
-                )
 
-            # string comp
-            if hash_ > read:
-                files_before = files_before + mid
-            else:
-                files_after = files_before + mid
+class MultiPackIndex(ShaTable):
+    """
+    Reader of a multi-pack-index over its mapping, one table for the
+    objects of many packs.
+    """
+    __slots__ = ('paths', 'packs', 'offset_start', 'large_start')
+
+    def __init__(self, data: mmap | bytes, pack_dir: str) -> None:
+        """
+        param `pack_dir`: The directory of the packs it lists.
+        """
+        (
+            magic, version, hash_version, chunks, bases, packs_count
+        ) = MIDX_HEADER.unpack_from(data)
+        # sha1 only, and not an incremental chain
+        if (
+            magic != MIDX_MAGIC
+            or version not in (1, 2)
+            or hash_version != 1
+            or bases
+        ):
+            raise ValueError('Unsupported multi-pack-index')
+
+        # {chunk id: (start, end)}, the table ends with a null id
+        starts = [
+            CHUNK.unpack_from(data, MIDX_HEADER.size + i * CHUNK.size)
+            for i in range(chunks + 1)
+        ]
+        bounds = {
+            id_: (start, starts[i + 1][1])
+            for i, (id_, start) in enumerate(starts[:-1])
+        }
+        try:
+            names_start, names_end = bounds[b'PNAM']
+            fanout_start = bounds[b'OIDF'][0]
+            self.sha_start = bounds[b'OIDL'][0]
+            self.offset_start = bounds[b'OOFF'][0]
+        except KeyError:
+            raise ValueError('Incomplete multi-pack-index') from None
+        self.large_start = bounds.get(b'LOFF', (None,))[0]
+
+        # names of the idx files, null terminated and padded
+        names = [
+            i.decode() for i in data[names_start:names_end].split(b'\0')
+            if i
+        ]
+        if len(names) != packs_count:
+            raise ValueError('Incomplete multi-pack-index')
+
+        self.data = data
+        self.fanout = FANOUT.unpack_from(data, fanout_start)
+        self.count = self.fanout[255]
+        self.paths = [
+            os.path.join(
+                pack_dir, i.removesuffix('.idx').removesuffix('.pack')
+            ) + '.pack'
+            for i in names
+        ]
+        self.packs = frozenset(self.paths)
+
+    def lookup(self, sha: bytes) -> tuple[str, int] | None:
+        """
+        return: tuple | None: The pack path and the offset of `sha`,
+                              None if not found.
+        """
+        pos = self.find(sha)
+        if pos < 0:
+            return None
 
-            mid = (files_after - files_before) // 2
+        pack_num, offset = PACK_OFFSET.unpack_from(
+            self.data, self.offset_start + pos * PACK_OFFSET.size
+        )
+        if offset & LARGE_OFFSET and self.large_start is not None:
+            start = self.large_start + (offset & ~LARGE_OFFSET) * 8
+            offset = int.from_bytes(self.data[start:start + 8], 'big')
+
+        return self.paths[pack_num], offset
+
+
+class MergedIndex(ShaTable):
+    """
+    In memory equivalent of a multi-pack-index, built from the idx
+    files of the packs. Objects in many packs are kept for each.
+    """
+    __slots__ = ('paths', 'packs', 'indexes', 'locations')
+
+    def __init__(
+        self,
+        paths: list[str],
+        indexes: list[PackIndex]
+    ) -> None:
+        keys: list[bytes] = []
+        for num, pack_index in enumerate(indexes):
+            start = pack_index.sha_start
+            shas = pack_index.data[
+                start:start + pack_index.count * SHA_SIZE
+            ]
+            keys += [
+                shas[i:i + SHA_SIZE] + LOCATION.pack(num, pos)
+                for pos, i in enumerate(range(0, len(shas), SHA_SIZE))
+            ]
+        # each idx is already sorted, a merge of runs
+        keys.sort()
+
+        self.data = b''.join([i[:SHA_SIZE] for i in keys])
+        self.locations = b''.join([i[SHA_SIZE:] for i in keys])
+        self.fanout = tuple(
+            sum(i) for i in zip(*(j.fanout for j in indexes))
+        )
+        self.count = len(keys)
+        self.sha_start = 0
+        self.paths = paths
+        self.packs = frozenset(paths)
+        self.indexes = indexes
 
-        return None
+    def lookup(self, sha: bytes) -> tuple[str, int] | None:
+        """
+        return: tuple | None: The pack path and the offset of `sha`,
+                              None if not found.
+        """
+        pos = self.find(sha)
+        if pos < 0:
+            return None
+
+        num, idx_pos = LOCATION.unpack_from(
+            self.locations, pos * LOCATION.size
+        )
+        return self.paths[num], self.indexes[num].get_offset(idx_pos)
+
+
+class Packs:
+    # {path: mapping} read-only maps of .pack and .idx files, packs are
+    # never rewritten in place so the maps are valid until closed.
+    # Closed by `close_packs` after each status: git can't delete a
+    # mapped file on Windows
+    maps: dict[str, mmap] = {}
+    # {idx path: reader over its map}
+    pack_indexes: dict[str, PackIndex] = {}
+    # {pack directory: (packs_list, index over all of them)}
+    multi_indexes: dict[
+        str, tuple[list[str], MultiPackIndex | MergedIndex | None]
+    ] = {}
+    # {(pack path, offset): content} objects that deltas were built on,
+    # packs are never rewritten in place
+    delta_base_cache: cache.LRUCache[tuple[str, int], bytes] = (
+        cache.LRUCache('delta bases', 256, 32 * 1024 * 1024)
+    )
+
+    __slots__ = ()
+
+    def get_pack_index(self, idx_path: str) -> PackIndex:
+        pack_index = self.pack_indexes.get(idx_path)
+        if pack_index is None:
+            pack_index = PackIndex(self._get_buffer(idx_path))
+            self.pack_indexes[idx_path] = pack_index
+
+        return pack_index
+
+    def get_multi_index(
+            self,
+            pack_dir: str,
+            packs_list: list[str]
+    ) -> MultiPackIndex | MergedIndex | None:
+        """
+        Gets one index for the objects of many packs, read from the
+        multi-pack-index of `pack_dir` or merged from the idx files.
+        It is kept while `packs_list` is the same, until `close_packs`
+        at the end of the status unmaps it for git to replace.
+        return: MultiPackIndex | MergedIndex | None: The index,
+                None if there are too few or too many objects to merge.
+        """
+        cached = self.multi_indexes.get(pack_dir)
+        if cached is not None and (
+            cached[0] is packs_list or cached[0] == packs_list
+        ):
+            return cached[1]
+
+        if cached is not None:
+            self.close_multi_index(pack_dir)
+
+        multi_index: MultiPackIndex | MergedIndex | None = None
+        midx_path = os.path.join(pack_dir, MIDX_NAME)
+        if os.path.exists(midx_path):
+            try:
+                multi_index = MultiPackIndex(
+                    self._get_buffer(midx_path), pack_dir
+                )
+            except (OSError, ValueError):
+                self._close_buffer(midx_path)
+
+        if multi_index is None and len(packs_list) >= MERGE_MIN_PACKS:
+            try:
+                indexes = [
+                    self.get_pack_index(self.get_idx_of_pack(i))
+                    for i in packs_list
+                ]
+            except (OSError, ValueError):
+                indexes = []
+            if (
+                indexes
+                and sum(map(len, indexes)) <= MERGE_MAX_OBJECTS
+            ):
+                multi_index = MergedIndex(packs_list, indexes)
+
+        self.multi_indexes[pack_dir] = packs_list, multi_index
+        return multi_index
+
+    def close_multi_index(self, pack_dir: str) -> None:
+        """
+        Drops the index of `pack_dir` and unmaps its multi-pack-index.
+        """
+        self.multi_indexes.pop(pack_dir, None)
+        self._close_buffer(os.path.join(pack_dir, MIDX_NAME))
+
+    def search_idx(
+            self,
+            idx_path: str,
+            hash_: str
+    ) -> int | None:
+        """
+        Searches given `idx_path` for `hash_`.
+        param `idx_path`: The path of the pack index file.
+        param `hash_`: The hash to be searched.
+        return: int | None: The offset for the hash. None if not found
+        """
+        try:
+            sha = bytes.fromhex(hash_)
+        except ValueError:
+            return None
+
+        return self.get_pack_index(idx_path).lookup(sha)
 
     def get_content_by_offset(
             self, pack_path: str, offset: int
     ) -> bytes | None:
         """
         Gets the content of object in given `pack_path` by its `offset`.
+        Deltified objects are resolved against their bases.
         param `pack_path`: The path to the pack file.
         param `offset`: The offset of the object.
         return: bytes | None: The content of the object,
-                              None it is a delta object
+                              None if a base of a delta wasn't found
         """
 
         file = self._get_buffer(pack_path)
 
-        file.seek(offset)
+        # [(offset, delta data)] from the object to its base
+        chain: list[tuple[int, bytes]] = []
+        cur_off = offset
+
+        while True:
+            cached = self.delta_base_cache.get((pack_path, cur_off))
+            if cached is not None:
+                content = cached
+                break
 
+            file.seek(cur_off)
+            type_, obj_size = self._read_obj_header(file)
+
+            if type_ == OFS_DELTA or type_ == REF_DELTA:
+                base_off = self._read_base_offset(
+                    file, pack_path, cur_off, type_
+                )
+                chain.append((cur_off, self._decompress(file, obj_size)))
+                if base_off is None:
+                    return None
+                cur_off = base_off
+
+            else:
+                content = self._decompress(file, obj_size)
+                break
+
+        if not chain:
+            return content
+
+        # the object itself is not a base, only the ones it was built on
+        size = len(content)
+        if cur_off != offset:
+            self.delta_base_cache.put((pack_path, cur_off), content, size)
+
+        for delta_off, delta in reversed(chain):
+            content = apply_delta(content, delta)
+            if delta_off != offset:
+                self.delta_base_cache.put(
+                    (pack_path, delta_off), content, len(content)
+                )
+
+        return content
+
+    def _read_obj_header(self, file: mmap) -> tuple[int, int]:
+        """
+        return: tuple: The type and the size of the object.
+        """
         byte = file.read(1)[0]
         type_ = (byte & 0x70) >> 4
 
-        if type_ in (6, 7):
-            return None
-
         obj_size = byte & 0x0f
         bit_shift = 4
         msb = byte & 0x80
@@ -106,12 +482,75 @@ class Packs:
             bit_shift += 7
             msb = byte & 0x80
 
-        # why + 11? On current tests it's the minimun value that don't raise
-        # I don't want to go byte by byte searching for eof because it's slow
-        # and zlib.decompress can deal with extra input
-        obj_data = zlib.decompress(file.read(obj_size + 11))
-        # assert len(obj_data) == obj_size
-        return obj_data
+        return type_, obj_size
+
+    def get_header_by_offset(
+            self, pack_path: str, offset: int
+    ) -> tuple[int, int] | None:
+        """
+        Gets the type and the size of an object without inflating it.
+        Only the start of a delta is inflated, for the size of its result,
+        and the type is the one of the base at the end of the chain.
+        return: tuple | None: The type and the size, None if a base of
+                              a delta wasn't found.
+        """
+        file = self._get_buffer(pack_path)
+        file.seek(offset)
+        type_, size = self._read_obj_header(file)
+
+        if type_ == OFS_DELTA or type_ == REF_DELTA:
+            base_off = self._read_base_offset(file, pack_path, offset, type_)
+            # the sizes of the base and of the result, up to 10 bytes each
+            delta, _ = objects.inflate(file, file.tell(), limit=20)
+            _, pos = read_delta_size(delta, 0)
+            size, _ = read_delta_size(delta, pos)
+
+            while type_ == OFS_DELTA or type_ == REF_DELTA:
+                if base_off is None:
+                    return None
+                file.seek(base_off)
+                type_, _ = self._read_obj_header(file)
+                base_off = self._read_base_offset(
+                    file, pack_path, base_off, type_
+                )
+
+        return type_, size
+
+    def _read_base_offset(
+            self, file: mmap, pack_path: str, offset: int, type_: int
+    ) -> int | None:
+        """
+        Reads where the base of a delta at `offset` is, the position of
+        `file` must be right after the object header.
+        return: int | None: The offset of the base, None if it isn't
+                            a delta or its base isn't in the pack.
+        """
+        if type_ == OFS_DELTA:
+            byte = file.read(1)[0]
+            base_off = byte & 0x7f
+            while byte & 0x80:
+                byte = file.read(1)[0]
+                base_off = ((base_off + 1) << 7) | (byte & 0x7f)
+            return offset - base_off
+
+        if type_ == REF_DELTA:
+            return self.get_pack_index(
+                self.get_idx_of_pack(pack_path)
+            ).lookup(file.read(20))
+
+        return None
+
+    def _decompress(self, file: mmap, obj_size: int) -> bytes:
+        """
+        Inflates the object at the position of `file`, leaving it right
+        after the stream.
+        """
+        content, end = objects.inflate(file, file.tell(), obj_size)
+        if len(content) != obj_size:
+            raise ValueError('Packed object of unexpected size')
+
+        file.seek(end)
+        return content
 
     def get_idx_of_pack(self, pack: str) -> str:
         """
@@ -119,37 +558,45 @@ class Packs:
         """
         return pack.removesuffix('pack') + 'idx'
 
-    def _get_buffer(self, path: str) -> BytesIO | BufferedReader:
-        mtime = os.stat(path, follow_symlinks=False).st_mtime
-        cache = self.bytes_io_cache.get(path)
-        if cache and cache[0] == mtime:
-            c = cache[1]
-            c.seek(0)
-            return c
-
-        raw = open(path, 'rb')
-        self.streams_to_transform_in_bytes_io.append((mtime, path, raw))
-        return raw
-
-    def _write_buffer(self) -> None:
-        while self.streams_to_transform_in_bytes_io:
-            mtime, path, raw = self.streams_to_transform_in_bytes_io.pop()
-            raw.seek(0)
-            c = BytesIO(raw.read())
-            raw.close()
-
-            self.bytes_io_cache[path] = mtime, c
-
-    def get_offset(
-        self, file: BytesIO | BufferedReader,
-        total_files: int,
-        target: int
-    ) -> int:
-        file.seek(
-            1032
-            + 20 * total_files  # jump layer2
-            + 4 * total_files  # jump layer3
-            + 4 * target
-        )
+    def _get_buffer(self, path: str) -> mmap:
+        mapping = self.maps.get(path)
+        if mapping is None:
+            fd = open_shared(path)
+            try:
+                mapping = mmap(fd, 0, access=ACCESS_READ)
+            finally:
+                # the map keeps its own handle
+                os.close(fd)
+            self.maps[path] = mapping
+
+        return mapping
 
-        return int.from_bytes(file.read(4), 'big')
+    def close_packs(self, packs: Iterable[str] | None = None) -> None:
+        """
+        Unmaps the given packs and their idx files.
+        param `packs`: The paths of the packs, None for every mapped file.
+        """
+        if packs is None:
+            paths = list(self.maps)
+            self.multi_indexes.clear()
+        else:
+            paths = []
+            for pack in packs:
+                paths += pack, self.get_idx_of_pack(pack)
+            # the indexes over them would point to closed maps
+            stale = [
+                pack_dir
+                for pack_dir, (_, multi) in self.multi_indexes.items()
+                if multi is not None and not multi.packs.isdisjoint(paths)
+            ]
+            for pack_dir in stale:
+                self.close_multi_index(pack_dir)
+
+        for path in paths:
+            self._close_buffer(path)
+
+    def _close_buffer(self, path: str) -> None:
+        self.pack_indexes.pop(path, None)
+        mapping = self.maps.pop(path, None)
+        if mapping is not None:
+            mapping.close()
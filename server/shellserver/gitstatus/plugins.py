@@ -3,7 +3,8 @@ __all__ = (
     'HAS_SSD_CHECKER',
     'DRIVE_SSD_MAP',
     'pygit2',
-    'FileSystemEvent'
+    'FileSystemEvent',
+    'ObservedWatch'
 )
 
 try:
@@ -48,6 +49,7 @@ except ImportError:
 try:
     from watchdog.observers import Observer
     from watchdog.events import FileSystemEvent
+    from watchdog.observers.api import ObservedWatch
     observer = Observer()
     observer.start()
     HAS_WATCHDOG = True
@@ -56,3 +58,6 @@ except ImportError:
 
     class FileSystemEvent:
         ...
+
+    class ObservedWatch:
+        ...
@@ -0,0 +1,98 @@
+"""
+Resolution of git references: symbolic, loose and packed ones.
+https://git-scm.com/docs/gitrepository-layout
+"""
+
+import os
+
+from . import cache
+
+__all__ = (
+    'SYMREF', 'HEADS', 'read_loose', 'parse_packed_refs',
+    'get_packed_refs', 'resolve'
+)
+
+SYMREF = 'ref: '
+HEADS = 'refs/heads/'
+# symbolic refs followed before giving up, as git does
+MAX_DEPTH = 5
+
+# {git_dir: {ref name: hash}} stamped with the stat of packed-refs
+packed_refs_cache: cache.LRUCache[str, dict[str, str]] = (
+    cache.LRUCache('packed refs', 64)
+)
+
+
+def read_loose(git_dir: str, name: str) -> str | None:
+    """
+    Reads a ref kept in its own file.
+    param `name`: Full name like 'HEAD' or 'refs/heads/feature/login'.
+    return: str | None: The hash or 'ref: <target>', None if there's no
+                        such file.
+    """
+    path = os.path.join(git_dir, '.git', name)
+    try:
+        with open(path) as in_file:
+            return in_file.read().strip()
+    # also a directory of refs, like refs/heads/feature
+    except OSError:
+        return None
+
+
+def parse_packed_refs(content: str) -> dict[str, str]:
+    """
+    Parses a packed-refs file, peeled lines are skipped.
+    return: dict: {ref name: hash}
+    """
+    res = {}
+    for line in content.splitlines():
+        if not line or line[0] in '#^':
+            continue
+        hash_, _, name = line.partition(' ')
+        res[name.strip()] = hash_
+
+    return res
+
+
+def get_packed_refs(git_dir: str) -> dict[str, str]:
+    """
+    Gets the parsed packed-refs of the repo, parsed again only when
+    the file changes.
+    return: dict: {ref name: hash}, empty if there's no packed-refs.
+    """
+    path = os.path.join(git_dir, '.git/packed-refs')
+    try:
+        st = os.stat(path)
+    except OSError:
+        packed_refs_cache.pop(git_dir)
+        return {}
+
+    stamp = st.st_mtime_ns, st.st_size
+    packed = packed_refs_cache.get(git_dir, stamp)
+    if packed is None:
+        with open(path) as in_file:
+            packed = parse_packed_refs(in_file.read())
+        packed_refs_cache.put(git_dir, packed, stamp=stamp)
+
+    return packed
+
+
+def resolve(git_dir: str, name: str) -> str | None:
+    """
+    Gets the hash a ref points to, following symbolic refs.
+    Loose refs take precedence over packed ones.
+    param `name`: Full name like 'HEAD' or 'refs/heads/feature/login'.
+    return: str | None: The hash, None for unborn branches or too long
+                        chains of symbolic refs.
+    """
+    for _ in range(MAX_DEPTH):
+        content = read_loose(git_dir, name)
+        if content is None:
+            return get_packed_refs(git_dir).get(name)
+
+        if not content.startswith(SYMREF):
+            return content or None
+
+        name = content.removeprefix(SYMREF).strip()
+
+    return None
@@ -0,0 +1,237 @@
+"""
+Per repository choice of the backend that gets the status,
+learned from the measured latencies and failures.
+"""
+
+import os
+import pickle
+import time
+from typing import Any
+
+from . import cache
+
+__all__ = ('NATIVE', 'GIT', 'PYGIT2', 'BackendStats', 'RepoStats', 'Selector')
+
+NATIVE = 'native'
+GIT = 'git'
+PYGIT2 = 'pygit2'
+
+# weight of the last run in the latency average
+ALPHA = 0.3
+# seconds between saves not forced
+SAVE_INTERVAL = 60
+
+
+class BackendStats:
+    """
+    Measures of a backend for one repository.
+    """
+    __slots__ = ('latency', 'runs', 'failures', 'reason', 'last_run')
+
+    def __init__(
+        self,
+        latency: float | None = None,
+        runs: int = 0,
+        failures: int = 0,
+        reason: str | None = None,
+        last_run: float = 0.0
+    ) -> None:
+        # moving average in ms of the successful runs
+        self.latency = latency
+        self.runs = runs
+        # consecutive ones, zeroed by a success
+        self.failures = failures
+        self.reason = reason
+        self.last_run = last_run
+
+    def as_tuple(self) -> tuple[float | None, int, int, str | None, float]:
+        return (
+            self.latency, self.runs, self.failures, self.reason,
+            self.last_run
+        )
+
+    def __repr__(self) -> str:
+        latency = 'untimed' if self.latency is None else f'{self.latency}ms'
+        return (
+            f'{latency}, {self.runs} runs, {self.failures} failures'
+            + (f' ({self.reason})' if self.reason else '')
+        )
+
+
+class RepoStats(dict[str, BackendStats]):
+    """
+    {backend: stats} of one repository.
+    """
+    __slots__ = ('calls',)
+
+    def __init__(self, *args: Any) -> None:
+        super().__init__(*args)
+        # since the last probe, not kept between runs
+        self.calls = 0
+
+
+class Selector:
+    """
+    Routes each repository to the fastest backend that works for it.
+    Each backend is tried once first. Then, every `probe_every` calls
+    of a repository another backend is tried, the one that ran the
+    longest ago.
+    """
+    __slots__ = ('path', 'backends', 'probe_every', 'repos', 'changed',
+                 'saved_at')
+
+    def __init__(
+        self,
+        path: str | None,
+        backends: tuple[str, ...] = (NATIVE, GIT),
+        probe_every: int = 32,
+        max_repos: int = 256
+    ) -> None:
+        """
+        param `path`: File where the verdicts are kept between runs,
+                      None to not keep them.
+        param `backends`: The ones that can be chosen, the first is
+                          used for repositories not seen yet.
+        """
+        self.path = path
+        self.backends = backends
+        self.probe_every = probe_every
+        # {git_dir: {backend: stats}}
+        self.repos: cache.LRUCache[str, RepoStats] = (
+            cache.LRUCache('backends', max_repos)
+        )
+        self.changed = False
+        self.saved_at = time.monotonic()
+        self.load()
+
+    def choose(self, git_dir: str) -> str:
+        repo = self.repos.get(git_dir)
+        if repo is None:
+            return self.backends[0]
+
+        # a single success would be the best until the next probe
+        for backend in self.backends:
+            if backend not in repo:
+                return backend
+
+        best = self.get_best(repo)
+
+        repo.calls += 1
+        if best is not None and repo.calls < self.probe_every:
+            return best
+
+        repo.calls = 0
+        others = [i for i in self.backends if i != best]
+        if not others:
+            return self.backends[0]
+
+        return min(
+            others,
+            key=lambda x: repo[x].last_run if x in repo else 0.0
+        )
+
+    def get_best(self, repo: RepoStats) -> str | None:
+        """
+        return: str | None: The fastest backend without failures,
+                            None if there is no such one.
+        """
+        working = [
+            i for i in self.backends
+            if i in repo
+            and not repo[i].failures
+            and repo[i].latency is not None
+        ]
+        if not working:
+            return None
+
+        return min(working, key=lambda x: repo[x].latency or 0.0)
+
+    def record(
+        self,
+        git_dir: str,
+        backend: str,
+        took: float,
+        reason: str | None = None
+    ) -> None:
+        """
+        param `took`: The time of the run in ms.
+        param `reason`: Why the backend failed, None if it didn't.
+        """
+        repo = self.repos.get(git_dir)
+        if repo is None:
+            repo = RepoStats()
+            self.repos.put(git_dir, repo)
+
+        stats = repo.get(backend)
+        if stats is None:
+            stats = repo[backend] = BackendStats()
+
+        stats.runs += 1
+        stats.last_run = time.time()
+
+        if reason is not None:
+            stats.failures += 1
+            stats.reason = reason
+
+        else:
+            stats.failures = 0
+            stats.reason = None
+            if stats.latency is None:
+                stats.latency = round(took, 3)
+            else:
+                stats.latency = round(
+                    ALPHA * took + (1 - ALPHA) * stats.latency, 3
+                )
+
+        self.changed = True
+
+    def load(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'rb') as in_file:
+                content = pickle.load(in_file)
+
+            for git_dir, backends in content.items():
+                self.repos.put(git_dir, RepoStats({
+                    name: BackendStats(*values)
+                    for name, values in backends.items()
+                }))
+
+        # unreadable or from an older format
+        except Exception:
+            self.repos.clear()
+
+    def save(self, force: bool = False) -> None:
+        """
+        Writes the verdicts if they changed and, unless `force`,
+        if the last write was `SAVE_INTERVAL` seconds ago.
+        """
+        if self.path is None or not self.changed:
+            return
+        if not force and time.monotonic() - self.saved_at < SAVE_INTERVAL:
+            return
+
+        # plain values, not tied to the classes of this module
+        content = {
+            git_dir: {
+                name: stats.as_tuple()
+                for name, stats in backends.items()
+            }
+            for git_dir, backends in self.repos.items()
+        }
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as out:
+            pickle.dump(content, out, protocol=5)
+
+        self.changed = False
+        self.saved_at = time.monotonic()
+
+    def __repr__(self) -> str:
+        return '\n'.join(
+            f'{git_dir}: '
+            + '; '.join(f'{k}: {v}' for k, v in backends.items())
+            for git_dir, backends in self.repos.items()
+        )
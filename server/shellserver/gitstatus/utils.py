@@ -1,13 +1,16 @@
 import os
 import ctypes
 import ctypes.wintypes
+import msvcrt
 from typing import Any
 
-__all__ = ('DiscardOutput', 'DirEntryWrapper', 'read_async')
+__all__ = ('DiscardOutput', 'DirEntryWrapper', 'read_async', 'open_shared')
 
 FILE_FLAG_OVERLAPPED = 0x40000000
 GENERIC_READ = 0x80000000
 OPEN_EXISTING = 3
+FILE_SHARE_ALL = 0x1 | 0x2 | 0x4  # read, write and delete
+INVALID_HANDLE_VALUE = -1
 
 
 class DiscardOutput:
@@ -96,6 +99,29 @@ def read_async(path: str, size: int) -> tuple[ctypes.Array[Any], OVERLAPPED]:
     return buffer, overlapped
 
 
+def open_shared(path: str) -> int:
+    """
+    Opens `path` for reading while letting others delete or rename it,
+    what `open` doesn't allow. Not once it's mapped: the maps are
+    closed at the end of each status.
+    return: int: A file descriptor, to be closed with `os.close`.
+    """
+    file_handle = kernel32.CreateFileW(
+        path,
+        GENERIC_READ,
+        FILE_SHARE_ALL,
+        None,
+        OPEN_EXISTING,
+        0,
+        None,
+    )
+
+    if file_handle == INVALID_HANDLE_VALUE:
+        raise ctypes.WinError()
+
+    return msvcrt.open_osfhandle(file_handle, os.O_RDONLY)
+
+
 PathMatchSpecW = ctypes.windll.shlwapi.PathMatchSpecW
 PathMatchSpecW.argtypes = ctypes.wintypes.LPCWSTR, ctypes.wintypes.LPCWSTR
 PathMatchSpecW.restype = ctypes.wintypes.BOOL
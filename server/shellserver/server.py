@@ -12,7 +12,7 @@ from typing import Any
 
 from win_basic_tools import Ls
 
-from .__init__ import CONFIG_PATH, USER_HOME
+from .__init__ import BACKENDS_PATH, CONFIG_PATH, USER_HOME
 from . import utils
 from . import style
 from .gitstatus import interface
@@ -38,6 +38,7 @@ class Config:
     use_git: bool = False
     use_pygit2: bool = False
     git_timeout: int = 2500
+    status_deadline: int = 0
     let_crash: bool = False
     test_status: bool = False
     linear: bool = False
@@ -46,6 +47,12 @@ class Config:
     workers: int = 0
     read_async: bool = True
     fallback: bool = True
+    adaptive: bool = True
+    backends_path: str | None = BACKENDS_PATH
+    dirty_only: bool = False
+    threaded: bool = False
+    index_cache_entries: int = 16
+    index_cache_bytes: int = 64 * 1024 * 1024
     output: str | None = None
 
 
@@ -111,6 +118,8 @@ class Server:
             'timeit',
             'no-trackdir',
             'no-fallback',
+            'no-adaptive',
+            'dirty-only',
             'no-watchdog',
             'disable-git',
             'use-git',
@@ -118,6 +127,7 @@ class Server:
             'test-status',
             'linear',
             'no-read-async',
+            'threaded',
             'multiproc',
             'permanent',
             'let-crash'
@@ -146,6 +156,7 @@ class Server:
             self.clients -= 1
             if not Config.permanent and self.clients <= 0:
                 self.cache.finish()
+                interface.finish()
                 return 1
 
         elif entry == 'Conf':
@@ -165,6 +176,7 @@ class Server:
 
         elif entry == 'Kill':
             self.cache.finish()
+            interface.finish()
             return 1
 
     def get_abs_by_ref(self, entry: str, addr: tuple[Any]) -> None: